@@ -0,0 +1,220 @@
+import argparse
+import json
+import numpy
+import platform
+import time
+import tracemalloc
+
+from SourceCode.BitSequence import BitSequence
+from SourceCode.RandomnessTests import RandomnessTester, Colours
+
+
+class Benchmarks:
+    def __init__(self, sizes=(10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7, 10 ** 8), data_sets=("pi", "e", "sqrt2", "sqrt3"),
+                 repeats=3, memory=True, seed=0):
+        """
+        This class measures how fast each of the NIST tests in the RandomnessTester runs. Every test is run on each of
+        the TestData sequences and on random sequences of each of the given sizes, and for each (test, input) pair the
+        throughput in bits per second and the peak memory allocated by the test are recorded. The records can be saved
+        as a baseline and a later run can be compared against it to find the tests which got slower or hungrier.
+        :param sizes: the lengths (in bits) of the random sequences to run the tests on
+        :param data_sets: the names of the TestData sequences to run the tests on
+        :param repeats: the number of times each test is timed (the fastest time is kept)
+        :param memory: whether to measure the peak memory, which needs one more (slower, traced) run of each test
+        :param seed: the seed of the random sequences, so that every run measures the same inputs
+        :return: a Benchmarks object
+        """
+        self.sizes = sizes
+        self.data_sets = data_sets
+        self.repeats = repeats
+        self.memory = memory
+        self.seed = seed
+        self.tester = RandomnessTester(None)
+
+    def get_tests(self):
+        """
+        This method lists the tests to benchmark along with the function which runs each one on a BitSequence
+        :return: a list of (name, function) pairs
+        """
+        rng = self.tester
+        return [("monobit", rng.monobit),
+                ("block_frequency", rng.block_frequency),
+                ("independent_runs", rng.independent_runs),
+                ("longest_runs", rng.longest_runs),
+                ("matrix_rank", rng.matrix_rank),
+                ("spectral", rng.spectral),
+                ("non_overlapping_patterns", rng.non_overlapping_patterns),
+                ("non_overlapping_patterns_battery", rng.non_overlapping_patterns_battery),
+                ("overlapping_patterns", rng.overlapping_patterns),
+                ("universal", rng.universal),
+                ("linear_complexity", rng.linear_complexity),
+                ("serial", lambda bin_data: rng.serial(bin_data, method="both")),
+                ("approximate_entropy", rng.approximate_entropy),
+                ("cumulative_sums", rng.cumulative_sums),
+                ("random_excursions", rng.random_excursions),
+                ("random_excursions_variant", rng.random_excursions_variant)]
+
+    def get_inputs(self):
+        """
+        This method generates the inputs to benchmark, one at a time so that only one big input is held at once
+        :return: a generator of (name, BitSequence) pairs
+        """
+        for data_set in self.data_sets:
+            yield data_set, self.tester.load_test_data(data_set)
+        generator = numpy.random.default_rng(self.seed)
+        for size in self.sizes:
+            packed = generator.integers(0, 256, (size + 7) // 8, dtype=numpy.uint8)
+            yield "random " + str(size), BitSequence(packed, size)
+
+    def measure(self, function, bin_data):
+        """
+        This method times one test on one input and (optionally) measures the peak memory it allocates
+        :param function: the test to run
+        :param bin_data: the BitSequence to run it on
+        :return: the fastest time in seconds, the peak memory in bytes (or None) and whether the test was skipped
+        """
+        seconds, skipped = None, False
+        for repeat in range(self.repeats):
+            start = time.perf_counter()
+            p_val = function(bin_data)
+            elapsed = time.perf_counter() - start
+            seconds = elapsed if seconds is None else min(seconds, elapsed)
+            skipped = numpy.all(numpy.asarray(p_val, dtype=float) == -1.0)
+            # Long runs are timed accurately enough by a single repeat
+            if elapsed > 1.0:
+                break
+        peak = None
+        if self.memory:
+            tracemalloc.start()
+            try:
+                function(bin_data)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        return seconds, peak, bool(skipped)
+
+    def run(self, verbose=True):
+        """
+        This method runs every test on every input
+        :param verbose: whether to print each record as it is measured
+        :return: a list of records (dictionaries) with one record for each (test, input) pair
+        """
+        records = []
+        for input_name, bin_data in self.get_inputs():
+            if verbose:
+                print(Colours.Bold + "\n\tBenchmarking on " + input_name + " (" + str(len(bin_data)) + " bits)" +
+                      Colours.End)
+            for test_name, function in self.get_tests():
+                seconds, peak, skipped = self.measure(function, bin_data)
+                # A test too fast for the clock to time has no throughput (JSON has no infinity to store)
+                record = {"test": test_name, "input": input_name, "bits": len(bin_data), "seconds": seconds,
+                          "bits_per_second": len(bin_data) / seconds if seconds > 0 else None,
+                          "peak_bytes": peak, "skipped": skipped}
+                records.append(record)
+                if verbose:
+                    print("\t" + self.get_string(record))
+        return records
+
+    def get_string(self, record):
+        """
+        This method formats one record for the console
+        :param record: a benchmark record
+        :return: a string
+        """
+        string = record["test"].ljust(36) + "{0:10.3f} ms".format(1000 * record["seconds"])
+        if record["bits_per_second"] is None:
+            string += "-".rjust(12) + " Mbit/s"
+        else:
+            string += "{0:12.2f} Mbit/s".format(record["bits_per_second"] / 1e6)
+        if record["peak_bytes"] is not None:
+            string += "{0:10.1f} MiB".format(record["peak_bytes"] / 2 ** 20)
+        if record["skipped"]:
+            string += "\t(skipped)"
+        return string
+
+    def save(self, records, path):
+        """
+        This method saves the records as a JSON baseline, along with a description of the machine they were run on
+        :param records: the records returned by run
+        :param path: the path of the file to write
+        """
+        baseline = {"python": platform.python_version(), "numpy": numpy.__version__, "machine": platform.platform(),
+                    "processor": platform.processor(), "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "records": records}
+        with open(path, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=1, allow_nan=False)
+
+    @staticmethod
+    def load(path):
+        """
+        This method loads a baseline which was written by save
+        :param path: the path of the baseline file
+        :return: the list of records in the baseline
+        """
+        with open(path, "r") as baseline_file:
+            return json.load(baseline_file)["records"]
+
+    def compare(self, records, baseline, tolerance=0.25, verbose=True):
+        """
+        This method compares the records of a run against a baseline. A (test, input) pair has regressed if its
+        throughput dropped, or its peak memory grew, by more than the tolerance. Very short runs are noisy so pairs
+        which took less than a millisecond in both runs are not checked for speed
+        :param records: the records returned by run
+        :param baseline: the records of the baseline (see load)
+        :param tolerance: the relative change which is allowed e.g. 0.25 allows a 25% drop in throughput
+        :param verbose: whether to print a line for each pair which is in both runs
+        :return: a list of (test, input, what, baseline value, new value) tuples, one for each regression
+        """
+        previous = {(record["test"], record["input"]): record for record in baseline}
+        regressions = []
+        for record in records:
+            key = (record["test"], record["input"])
+            if key not in previous:
+                continue
+            old = previous[key]
+            speedup = 1.0
+            if record["bits_per_second"] and old["bits_per_second"]:
+                speedup = record["bits_per_second"] / old["bits_per_second"]
+            slower = speedup < 1.0 - tolerance and max(record["seconds"], old["seconds"]) >= 0.001
+            if slower:
+                regressions.append(key + ("bits_per_second", old["bits_per_second"], record["bits_per_second"]))
+            hungrier = False
+            if record["peak_bytes"] is not None and old["peak_bytes"] is not None:
+                hungrier = record["peak_bytes"] > (1.0 + tolerance) * old["peak_bytes"] + 2 ** 16
+                if hungrier:
+                    regressions.append(key + ("peak_bytes", old["peak_bytes"], record["peak_bytes"]))
+            if verbose:
+                colour = Colours.Fail if slower or hungrier else Colours.Pass
+                print("\t" + colour + record["test"].ljust(36) + record["input"].ljust(16) +
+                      "{0:8.2f}x speed".format(speedup) + Colours.End)
+        return regressions
+
+
+if __name__ == '__main__':
+    """
+    Run this from the root of the project with python -m SourceCode.Benchmarks, e.g.
+    python -m SourceCode.Benchmarks --sizes 10000 1000000 --save baseline.json
+    python -m SourceCode.Benchmarks --sizes 10000 1000000 --compare baseline.json
+    """
+    parser = argparse.ArgumentParser(description="Measure the throughput of each of the NIST tests")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7, 10 ** 8],
+                        help="the lengths in bits of the random sequences")
+    parser.add_argument("--data-sets", nargs="*", default=["pi", "e", "sqrt2", "sqrt3"],
+                        help="the TestData sequences to include")
+    parser.add_argument("--repeats", type=int, default=3, help="the number of times each test is timed")
+    parser.add_argument("--no-memory", action="store_true", help="skip measuring the peak memory")
+    parser.add_argument("--save", help="write the results to this baseline file")
+    parser.add_argument("--compare", help="compare the results against this baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="the relative slowdown allowed by --compare")
+    args = parser.parse_args()
+
+    benchmarks = Benchmarks(args.sizes, args.data_sets, args.repeats, not args.no_memory)
+    results = benchmarks.run()
+    if args.save:
+        benchmarks.save(results, args.save)
+    if args.compare:
+        print(Colours.Bold + "\n\tComparing against " + args.compare + Colours.End)
+        found = benchmarks.compare(results, benchmarks.load(args.compare), args.tolerance)
+        print("\n\t", len(found), "regressions found")
+        if found:
+            exit(1)
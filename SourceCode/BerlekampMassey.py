@@ -0,0 +1,91 @@
+import numpy
+
+
+class BerlekampMassey:
+    def __init__(self, lanes, num_blocks):
+        """
+        This class runs the Berlekamp Massey algorithm on many blocks at once. The blocks are bit-sliced: bit k of word w
+        in row i of the lanes array is bit i of block 64 * w + k (up to a fixed permutation of the blocks inside each
+        word). Every polynomial is stored the same way, so a single XOR of two rows updates one coefficient of the
+        connection polynomials of 64 blocks at a time.
+        :param lanes: a numpy uint64 array of shape (block_size, num_words) holding the bit-sliced blocks
+        :param num_blocks: the number of blocks stored in the lanes
+        :return: a BerlekampMassey object
+        """
+        self.lanes = numpy.array(lanes, dtype=numpy.uint64)
+        self.block_size, self.num_words = self.lanes.shape
+        self.num_blocks = num_blocks
+
+    @classmethod
+    def from_sequence(cls, bin_data, block_size, num_blocks=None):
+        """
+        This method bit-slices consecutive non-overlapping blocks of a sequence
+        :param bin_data: a BitSequence
+        :param block_size: the number of bits in each block
+        :param num_blocks: the number of blocks, by default as many whole blocks as fit into the sequence
+        :return: a BerlekampMassey object
+        """
+        if num_blocks is None:
+            num_blocks = len(bin_data) // block_size
+        blocks = bin_data.blocks(block_size, num_blocks)
+        return cls(cls.to_lanes(blocks.T), num_blocks)
+
+    @staticmethod
+    def to_lanes(flags):
+        """
+        This method packs the last axis of an array of flags (one per block) into 64-bit lane words
+        :param flags: an array of zeros and ones (or booleans) whose last axis is indexed by block
+        :return: a numpy uint64 array whose last axis is indexed by word
+        """
+        flags = numpy.asarray(flags, dtype=bool)
+        num_words = (flags.shape[-1] + 63) // 64
+        padded = numpy.zeros(flags.shape[:-1] + (num_words * 64,), dtype=bool)
+        padded[..., :flags.shape[-1]] = flags
+        return numpy.packbits(padded, axis=-1).view(numpy.uint64)
+
+    @staticmethod
+    def from_lanes(words, num_blocks):
+        """
+        This method unpacks 64-bit lane words back into one flag per block (the inverse of to_lanes)
+        :param words: a numpy uint64 array of lane words
+        :param num_blocks: the number of blocks
+        :return: a numpy boolean array with one flag per block
+        """
+        return numpy.unpackbits(words.view(numpy.uint8))[:num_blocks].astype(bool)
+
+    def compute_complexities(self):
+        """
+        This method computes the linear complexity (the length of the shortest LFSR) of every block. It follows the
+        algorithm in the NIST documentation, but rather than keeping the previous connection polynomial B and the step m
+        at which it was saved (which differ between blocks), it keeps D = x^(i - m) * B. D is multiplied by x on every
+        step, which is the same shift for every block, so all of the updates can be done with whole-row operations.
+        :return: a numpy array containing the linear complexity of each block
+        """
+        n = self.block_size
+        ones = numpy.uint64(0xFFFFFFFFFFFFFFFF)
+        complexity = numpy.zeros(self.num_blocks, dtype=numpy.int64)
+        c = numpy.zeros((n + 2, self.num_words), dtype=numpy.uint64)
+        d = numpy.zeros((n + 2, self.num_words), dtype=numpy.uint64)
+        c[0], d[1] = ones, ones
+        # The sequence is reversed so that s[i - 1], s[i - 2], ..., s[0] is a forward slice
+        reversed_lanes = self.lanes[::-1]
+        for i in range(n):
+            # Connection polynomials have degree at most their complexity, so higher coefficients are all zero
+            top = min(i, int(complexity.max()) if self.num_blocks > 0 else 0)
+            terms = c[1:top + 1] & reversed_lanes[n - i:n - i + top]
+            discrepancy = self.lanes[i] ^ numpy.bitwise_xor.reduce(terms, axis=0)
+            if not discrepancy.any():
+                d[1:i + 3] = d[0:i + 2].copy()
+                d[0] = 0
+                continue
+            # Blocks with a discrepancy whose complexity is at most half of i get a longer LFSR
+            lengthen = self.from_lanes(discrepancy, self.num_blocks) & (2 * complexity <= i)
+            lengthen_lanes = self.to_lanes(lengthen)
+            k = i + 2
+            previous = c[:k].copy()
+            c[:k] ^= d[:k] & discrepancy
+            selected = (previous & lengthen_lanes) | (d[:k] & ~lengthen_lanes)
+            d[1:k + 1] = selected
+            d[0] = 0
+            complexity[lengthen] = i + 1 - complexity[lengthen]
+        return complexity
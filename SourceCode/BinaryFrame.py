@@ -1,12 +1,19 @@
 import math
+import numpy
 import bitstring
 
+from SourceCode.BitSequence import BitSequence
+from SourceCode.SampleWindows import SampleWindows
+from SourceCode.LazySampleWindows import LazySampleWindows
+from SourceCode.Instruments import Instruments
+
 
 class BinaryFrame:
-    def __init__(self, data, start, end, years_per_block):
+    def __init__(self, data, start, end, years_per_block, instruments=None):
         """
         Initialization method for a Binary Frame object
         :param data: a pandas DataFrame to convert
+        :param instruments: an Instruments object which measures the conversion of each column (None to not measure)
         """
         self.data = data
         self.bin_data = {}
@@ -17,54 +24,176 @@ class BinaryFrame:
         # print(self.time_periods, self.time_periods_fwd)
         self.columns = self.data.columns
         self.method = "discretize"
+        self.instruments = instruments
 
-    def convert(self, method, convert=True, independent_samples=True):
+    def convert(self, method, convert=True, independent_samples=True, lazy=False, cache_size=2):
         """
         A method for discretizing a pandas DataFrame into a Dictionary of Binary Strings
         1) If the return is +, then set the equivalent bit to 1
         2) If the return is -, then set the equivalent bit to 0
         Note that using this method compresses the data significantly
+        :param lazy: if true, nothing is converted until the tests ask for a sample and only the samples being tested
+        are held in memory (see LazySampleWindows)
+        :param cache_size: (lazy only) the number of converted samples to keep for each column
         :return:
         """
-        # For each data set i.e. security return sequences
+        encoders = {"discretize": self.discretize_values,
+                    "convert basis point": lambda values: self.convert_basis_point_values(values, convert),
+                    "convert floating point": self.convert_floating_point_values}
+        if method not in encoders:
+            print("Unknown conversion method ... exiting application")
+            exit(0)
+        if lazy:
+            self.convert_lazily(encoders[method], independent_samples, cache_size)
+            return
+        # Every column is converted into one packed array, each sample is a window of it
+        self.convert_columns(encoders[method], independent_samples)
+
+    def get_windows(self, independent_samples=True):
+        """
+        This method works out which days are in each sample
+        :param independent_samples: whether the samples are independent or overlapping (stepping forward one year)
+        :return: the index of the first day of each sample, the number of days in each sample, and the number of days
+        which are in at least one sample
+        """
+        days = len(self.data)
+        days_in_stream = math.floor(days / self.time_periods)
+        days_in_year = math.floor(days / self.time)
+        # The first day of each sample
+        if independent_samples:
+            firsts = numpy.arange(self.time_periods) * days_in_stream
+        else:
+            firsts = numpy.arange(max(self.time_periods_fwd, 0)) * days_in_year
+        used = int(firsts[-1]) + days_in_stream if len(firsts) else 0
+        if used > days:
+            raise ValueError("The data frame is too short for the samples", days, used)
+        return firsts, days_in_stream, used
+
+    def convert_columns(self, encode, independent_samples=True):
+        """
+        This method converts every column of the pandas DataFrame into one packed array. The values of the days which
+        are in at least one sample are encoded a column at a time (so that the conversion of each column is measured if
+        the frame has instruments), the bits of all the columns are packed at once, and the samples of each column are
+        windows of that array. The encodings can take a different number of bits for each value, so the bit position of
+        every value is found from the cumulative sum of their lengths. A window is only a start and a length, so
+        overlapping samples do not convert or store any day more than once
+        :param encode: a function which takes a one dimensional array of values and returns the bits of all of them
+        (concatenated) and the number of bits in the encoding of each value
+        :param independent_samples: whether the samples are independent or overlapping (stepping forward one year)
+        """
+        firsts, days_in_stream, used = self.get_windows(independent_samples)
+        values = numpy.asarray(self.data.values)[:used]
+        encoded = []
+        for k, data_set in enumerate(self.data.columns):
+            column = numpy.ascontiguousarray(values[:, k])
+            with Instruments.maybe_measure(self.instruments, "convert", data_set, column.nbytes):
+                encoded.append(encode(column))
+        with Instruments.maybe_measure(self.instruments, "convert", "(packing)", values.nbytes):
+            bits = numpy.concatenate([column_bits for column_bits, column_lengths in encoded])
+            lengths = numpy.concatenate([column_lengths for column_bits, column_lengths in encoded])
+            positions = numpy.zeros(len(lengths) + 1, dtype=numpy.int64)
+            numpy.cumsum(lengths, out=positions[1:])
+            packed = BitSequence.from_bits(bits)
+        for k, data_set in enumerate(self.data.columns):
+            starts = positions[k * used + firsts]
+            ends = positions[k * used + firsts + days_in_stream]
+            self.bin_data[data_set] = SampleWindows(packed, starts, ends - starts)
+
+    def convert_lazily(self, encode, independent_samples=True, cache_size=2):
+        """
+        This method sets up the samples of every column to be converted when they are asked for
+        :param encode: a function which takes a one dimensional array of values and returns the bits of all of them
+        (concatenated) and the number of bits in the encoding of each value
+        :param independent_samples: whether the samples are independent or overlapping (stepping forward one year)
+        :param cache_size: the number of converted samples to keep for each column
+        """
+        firsts, days_in_stream, used = self.get_windows(independent_samples)
+
+        def get_encoder(data_set):
+            # Each sample which is converted is measured under the name of its column
+            def encode_sample(values):
+                with Instruments.maybe_measure(self.instruments, "convert", data_set, values.nbytes):
+                    return encode(values)
+            return encode_sample
+
         for data_set in self.data.columns:
-            # List of binary streams
-            binary_streams = []
-            # Days stepped through
-            day = 0
-            days = len(self.data[data_set])
-            days_in_stream = math.floor(days / self.time_periods)
-            days_in_year = math.floor(days / self.time)
-            # While less binary streams than time periods
-            samples = self.time_periods
-            if not independent_samples:
-                samples = self.time_periods_fwd
-            while len(binary_streams) < samples:
-                # Start a new binary stream
-                binary_stream = ""
-                # Convert each day into binary
-                for j in range(day, (day + days_in_stream)):
-                    bit = ""
-                    if method == "discretize":
-                        bit = self.discretize(self.data[data_set][j])
-                    elif method == "convert basis point":
-                        bit = self.convert_basis_point(self.data[data_set][j], convert)
-                    elif method == "convert floating point":
-                        bit = self.convert_floating_point(self.data[data_set][j])
-                    else:
-                        print("Unknown conversion method ... exiting application")
-                        exit(0)
-                    # Add day to binary stream
-                    binary_stream += bit
-                    # Keep tack of days
-                    if independent_samples:
-                        day += 1
-                if not independent_samples:
-                    day += days_in_year
-                # Append binary stream to binary streams list
-                binary_streams.append(binary_stream)
-            # Set the binary data for this data set to the binary streams list
-            self.bin_data[data_set] = binary_streams
+            values = numpy.asarray(self.data[data_set].values)[:used]
+            self.bin_data[data_set] = LazySampleWindows(values, firsts, days_in_stream, get_encoder(data_set),
+                                                        cache_size)
+
+    def discretize_values(self, values):
+        """
+        This method discretizes an array of floating point numbers according to whether each is + or -, the same as
+        calling discretize on each of them: positive numbers become 1, negative numbers become 0 and zeros become 01
+        :param values: a numpy array of floating point numbers
+        :return: a numpy bool array of the bits, and the number of bits for each value
+        """
+        values = numpy.asarray(values, dtype=float)
+        if numpy.isnan(values).any():
+            raise ValueError("Missing values (NaN) can not be discretized")
+        bits = values > 0.0
+        zeros = numpy.flatnonzero(values == 0.0)
+        # Each zero becomes the 1 of its own position with a 0 inserted in front of it
+        bits[zeros] = True
+        bits = numpy.insert(bits, zeros, False)
+        return bits, numpy.where(values == 0.0, 2, 1)
+
+    def convert_basis_point_values(self, values, convert=True):
+        """
+        This method converts an array of floating point numbers to integers (basis points) and then to binary, the same
+        as calling convert_basis_point on each of them. The magnitude of each integer is unpacked from a uint64 into a
+        row of 64 bits, the bits of negative numbers are flipped with an XOR, and the sign bit and the significant bits
+        of each row (everything after its leading zeros) are picked out with a mask, which concatenates the encodings
+        :param values: a numpy array of floating point numbers (or integers)
+        :param convert: if true, then the numbers are not already integers
+        :return: a numpy bool array of the bits, and the number of bits for each value
+        """
+        values = numpy.asarray(values)
+        if convert:
+            scaled = values.astype(float) * 100
+            if not numpy.isfinite(scaled).all() or (numpy.abs(scaled) >= 2.0 ** 63).any():
+                raise ValueError("Only finite numbers can be converted to basis points")
+            # Like int() this truncates towards zero
+            values = scaled.astype(numpy.int64)
+        elif not numpy.issubdtype(values.dtype, numpy.integer):
+            if (values != numpy.trunc(values)).any():
+                raise TypeError("The numbers must be integers to be converted without scaling them")
+        values = values.astype(numpy.int64)
+        magnitudes = numpy.abs(values).astype(numpy.uint64)
+        # A zero is encoded as 01, i.e. like a negative number with a single (flipped) bit
+        negative = values <= 0
+        magnitudes[negative] ^= numpy.uint64(2 ** 64 - 1)
+        rows = numpy.unpackbits(magnitudes.astype(">u8").view(numpy.uint8)).reshape(-1, 64)
+        # The number of significant bits of each magnitude (zero has the one bit of its encoding)
+        significant = numpy.where(values == 0, 1, 64 - numpy.argmax(rows != negative[:, None], axis=1))
+        rows = numpy.concatenate(((values > 0)[:, None], rows.astype(bool)), axis=1)
+        mask = numpy.arange(65) >= 65 - significant[:, None]
+        mask[:, 0] = True
+        return rows[mask], significant + 1
+
+    def convert_floating_point_values(self, values, length=64):
+        """
+        This method converts an array of floating point numbers into binary using the IEEE 754 method, the same as
+        calling convert_floating_point on each of them. The numbers are reinterpreted as unsigned integers with a numpy
+        view, the bits of negative numbers (apart from the sign) are flipped with an XOR, and then the bits are
+        unpacked into one row for each number with the sign bit replaced by 1 for positive numbers and 0 for negative
+        numbers. Zeros (and NaN) are encoded as 01
+        :param values: a numpy array of floating point numbers
+        :param length: the length of the IEEE 754 encoding (16, 32 or 64 bits)
+        :return: a numpy bool array of the bits, and the number of bits for each value
+        """
+        float_type, word_type = {16: (numpy.float16, numpy.uint16), 32: (numpy.float32, numpy.uint32),
+                                 64: (numpy.float64, numpy.uint64)}[length]
+        values = numpy.asarray(values, dtype=float)
+        words = values.astype(float_type).view(word_type).copy()
+        words[values < 0.0] ^= word_type(2 ** (length - 1) - 1)
+        rows = numpy.unpackbits(words.astype(">u" + str(length // 8)).view(numpy.uint8)).reshape(-1, length)
+        rows = rows.astype(bool)
+        rows[:, 0] = values > 0.0
+        zeros = ~((values > 0.0) | (values < 0.0))
+        rows[zeros, 1] = True
+        lengths = numpy.where(zeros, 2, length)
+        return rows[numpy.arange(length) < lengths[:, None]], lengths
 
     def discretize(self, floating_point):
         """
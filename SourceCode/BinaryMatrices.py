@@ -0,0 +1,70 @@
+import numpy
+
+
+class BinaryMatrices:
+    def __init__(self, rows, num_cols):
+        """
+        This class computes the **binary rank** of a whole stack of matrices at once. Each row of each matrix is stored
+        as one (or more) 64-bit machine words, so adding two rows over GF(2) is a single XOR, and every elimination step
+        is applied to all of the matrices in the stack together instead of one matrix at a time.
+        :param rows: a numpy uint64 array of shape (num_matrices, num_rows, num_words) holding the packed rows
+        :param num_cols: the number of columns in each matrix
+        :return: a BinaryMatrices object
+        """
+        self.rows = numpy.array(rows, dtype=numpy.uint64)
+        self.num_matrices, self.num_rows, self.num_words = self.rows.shape
+        self.num_cols = num_cols
+
+    @classmethod
+    def from_sequence(cls, bin_data, num_rows, num_cols, num_matrices=None):
+        """
+        This method fills the matrices row by row from consecutive bits of a sequence (as in the NIST test)
+        :param bin_data: a BitSequence
+        :param num_rows: the number of rows in each matrix
+        :param num_cols: the number of columns in each matrix
+        :param num_matrices: the number of matrices, by default as many as fit into the sequence
+        :return: a BinaryMatrices object
+        """
+        if num_matrices is None:
+            num_matrices = len(bin_data) // (num_rows * num_cols)
+        num_words = (num_cols + 63) // 64
+        bits = bin_data.blocks(num_cols, num_matrices * num_rows)
+        packed = numpy.zeros((num_matrices * num_rows, num_words * 8), dtype=numpy.uint8)
+        packed[:, :(num_cols + 7) // 8] = numpy.packbits(bits, axis=1)
+        # The order of the columns inside the words does not matter because the rank is the same under any permutation
+        rows = packed.view(numpy.uint64).reshape(num_matrices, num_rows, num_words)
+        return cls(rows, num_cols)
+
+    def compute_ranks(self):
+        """
+        This method computes the binary rank of every matrix in the stack using Gaussian elimination. For each column
+        the first row at or below the current rank which has a one in that column becomes the pivot, it is swapped into
+        place, and it is XOR'ed into every row below it which also has a one in that column.
+        :return: a numpy array containing the rank of each matrix
+        """
+        rows = self.rows.copy()
+        rank = numpy.zeros(self.num_matrices, dtype=numpy.int64)
+        matrix_index = numpy.arange(self.num_matrices)
+        row_index = numpy.arange(self.num_rows)
+        for word in range(self.num_words):
+            # Columns which are zero in every matrix can never hold a pivot
+            used = int(numpy.bitwise_or.reduce(rows[:, :, word], axis=None))
+            for bit in range(64):
+                if not (used >> bit) & 1:
+                    continue
+                mask = numpy.uint64(1) << numpy.uint64(bit)
+                candidates = ((rows[:, :, word] & mask) != 0) & (row_index >= rank[:, None])
+                found = candidates.any(axis=1)
+                if not found.any():
+                    continue
+                # Swap the pivot row of each matrix into the row given by its current rank
+                f, r = matrix_index[found], rank[found]
+                p = candidates[found].argmax(axis=1)
+                pivots = rows[f, p]
+                rows[f, p] = rows[f, r]
+                rows[f, r] = pivots
+                # Eliminate the column from all of the rows below the pivot
+                below = ((rows[f, :, word] & mask) != 0) & (row_index > r[:, None])
+                rows[f] ^= numpy.where(below[:, :, None], pivots[:, None, :], numpy.uint64(0))
+                rank[found] += 1
+        return rank
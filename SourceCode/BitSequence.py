@@ -0,0 +1,605 @@
+import numpy
+import hashlib
+import os
+
+# The number of ones in each possible byte
+popcount_table = numpy.array([bin(i).count("1") for i in range(256)], dtype=numpy.uint8)
+
+
+class BitSequence:
+    # The number of bits which are unpacked at a time when the sequence is processed in chunks
+    chunk_size = 1 << 23
+
+    def __init__(self, packed, length=None, offset=0):
+        """
+        A BitSequence is a packed representation of a binary string. The bits are stored eight to a byte (most
+        significant bit first) in a numpy uint8 buffer, so a sequence of n bits costs n / 8 bytes instead of the n bytes
+        taken by a string of '0' and '1' characters. Slicing a BitSequence returns a view which shares the buffer of the
+        original sequence, so samples and blocks of a long sequence can be taken without copying any data.
+        :param packed: a numpy uint8 array (or any buffer which can be viewed as one) containing the packed bits
+        :param length: the number of bits in the sequence, by default every bit in the buffer after the offset
+        :param offset: the position of the first bit of the sequence in the buffer
+        :return: a BitSequence object
+        """
+        packed = numpy.asarray(packed)
+        if packed.dtype != numpy.uint8:
+            packed = packed.view(numpy.uint8)
+        packed = packed.reshape(-1)
+        if length is None:
+            length = 8 * len(packed) - offset
+        if offset < 0 or length < 0 or offset + length > 8 * len(packed):
+            raise ValueError("Bit range out of bounds of the packed buffer", offset, length)
+        # Keep the offset inside the first byte so that views of views do not drift
+        self.packed = packed[offset // 8:]
+        self.offset = offset % 8
+        self.length = length
+
+    @classmethod
+    def from_string(cls, bin_data: str):
+        """
+        This method packs a string of '0' and '1' characters into a BitSequence. The string is packed in chunks so that
+        the temporary arrays never grow bigger than the chunk size
+        :param bin_data: a binary string
+        :return: a BitSequence
+        """
+        n = len(bin_data)
+        packed = numpy.empty((n + 7) // 8, dtype=numpy.uint8)
+        for start in range(0, n, cls.chunk_size):
+            chars = numpy.frombuffer(bin_data[start:start + cls.chunk_size].encode("ascii"), dtype=numpy.uint8)
+            bits = chars - ord('0')
+            if (bits > 1).any():
+                raise ValueError("Binary strings may only contain the characters '0' and '1'")
+            packed[start // 8:(start + len(bits) + 7) // 8] = numpy.packbits(bits)
+        return cls(packed, n)
+
+    @classmethod
+    def from_bits(cls, bits):
+        """
+        This method packs an array of zeros and ones (one element per bit) into a BitSequence
+        :param bits: a numpy array or list of zeros and ones
+        :return: a BitSequence
+        """
+        bits = numpy.asarray(bits)
+        return cls(numpy.packbits(bits.astype(bool)), len(bits))
+
+    @classmethod
+    def from_bytes(cls, raw, length=None):
+        """
+        This method wraps raw bytes (e.g. the output of a generator) in a BitSequence without copying them
+        :param raw: a bytes-like object
+        :param length: the number of bits to use, by default all of them
+        :return: a BitSequence
+        """
+        return cls(numpy.frombuffer(raw, dtype=numpy.uint8), length)
+
+    @classmethod
+    def from_file(cls, path, length=None):
+        """
+        This method memory-maps a raw binary file (eight bits to a byte, first bit most significant) as a BitSequence.
+        Nothing is read until the bits are used, and slices of the sequence only touch the pages they cover, so files
+        which are much bigger than memory can be tested
+        :param path: the path to the file
+        :param length: the number of bits to use, by default all of them
+        :return: a BitSequence
+        """
+        if os.path.getsize(path) == 0:
+            return cls(numpy.zeros(0, dtype=numpy.uint8), 0)
+        return cls(numpy.memmap(path, dtype=numpy.uint8, mode="r"), length)
+
+    @classmethod
+    def from_ascii_file(cls, path, cache=True):
+        """
+        This method decodes a file of '0' and '1' characters (any whitespace is ignored) into a BitSequence. The file is
+        decoded one chunk at a time. If cache is true the packed bits are written to a sidecar file next to the file
+        (path + ".bits") and memory-mapped from there, and later loads use the sidecar for as long as it is newer than
+        the file. If the sidecar can not be written the bits are kept in memory instead
+        :param path: the path to the file
+        :param cache: whether to use (and create) the packed sidecar file
+        :return: a BitSequence
+        """
+        sidecar = path + ".bits"
+        if cache and os.path.exists(sidecar) and os.path.getmtime(sidecar) >= os.path.getmtime(path):
+            return cls.from_sidecar(sidecar)
+        pieces = []
+        if cache:
+            temporary = sidecar + "." + str(os.getpid())
+            try:
+                with open(temporary, "wb") as sidecar_file:
+                    # The header holds the number of bits, it is filled in once the whole file has been decoded
+                    sidecar_file.write(numpy.zeros(1, dtype="<u8").tobytes())
+                    length = cls.decode_ascii_file(path, sidecar_file.write)
+                    sidecar_file.seek(0)
+                    sidecar_file.write(numpy.array([length], dtype="<u8").tobytes())
+                os.replace(temporary, sidecar)
+                return cls.from_sidecar(sidecar)
+            except OSError:
+                pass
+            finally:
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+        length = cls.decode_ascii_file(path, pieces.append)
+        return cls(numpy.frombuffer(b"".join(pieces), dtype=numpy.uint8), length)
+
+    @classmethod
+    def from_sidecar(cls, path):
+        """
+        This method memory-maps a packed sidecar file written by from_ascii_file (an eight byte little endian count of
+        the bits followed by the packed bits)
+        :param path: the path to the sidecar file
+        :return: a BitSequence
+        """
+        length = int(numpy.fromfile(path, dtype="<u8", count=1)[0])
+        if length == 0:
+            return cls(numpy.zeros(0, dtype=numpy.uint8), 0)
+        return cls(numpy.memmap(path, dtype=numpy.uint8, mode="r", offset=8), length)
+
+    @classmethod
+    def decode_ascii_file(cls, path, write):
+        """
+        This method decodes a file of '0' and '1' characters one chunk at a time and passes the packed bytes on
+        :param path: the path to the file
+        :param write: a function which is called with each packed chunk of bytes, in order
+        :return: the number of bits decoded
+        """
+        length = 0
+        leftover = numpy.zeros(0, dtype=numpy.uint8)
+        whitespace = numpy.frombuffer(b" \t\r\n\v\f", dtype=numpy.uint8)
+        with open(path, "rb") as ascii_file:
+            while True:
+                chars = numpy.frombuffer(ascii_file.read(cls.chunk_size), dtype=numpy.uint8)
+                if len(chars) == 0:
+                    break
+                digits = (chars == ord('0')) | (chars == ord('1'))
+                if not (digits | numpy.isin(chars, whitespace)).all():
+                    raise ValueError("Binary files may only contain the characters '0' and '1' and whitespace", path)
+                bits = numpy.concatenate((leftover, chars[digits] - ord('0')))
+                # Only whole bytes are packed, the last few bits are carried into the next chunk
+                whole = len(bits) - len(bits) % 8
+                write(numpy.packbits(bits[:whole]).tobytes())
+                leftover = bits[whole:]
+                length += whole
+        if len(leftover) > 0:
+            write(numpy.packbits(leftover).tobytes())
+            length += len(leftover)
+        return length
+
+    @classmethod
+    def load(cls, path, cache=True):
+        """
+        This method loads a sequence from a file, which may either hold raw bytes (which are memory-mapped) or '0' and
+        '1' characters (which are decoded, see from_ascii_file). The two are told apart by the start of the file, which
+        is taken to be characters if nearly all of it is '0', '1' or whitespace
+        :param path: the path to the file
+        :param cache: whether to use (and create) a packed sidecar file for files of characters
+        :return: a BitSequence
+        """
+        with open(path, "rb") as data_file:
+            start = data_file.read(1 << 16)
+        if len(start) > 0 and len(start.translate(None, b"01 \t\r\n\v\f")) <= 0.1 * len(start):
+            return cls.from_ascii_file(path, cache)
+        return cls.from_file(path)
+
+    @classmethod
+    def convert(cls, bin_data):
+        """
+        This method converts the input to one of the tests into a BitSequence. BitSequence objects are returned as they
+        are, so a sample only needs to be converted once before it is passed to all of the tests
+        :param bin_data: a binary string, a BitSequence, or an array of zeros and ones
+        :return: a BitSequence
+        """
+        if isinstance(bin_data, cls):
+            return bin_data
+        if isinstance(bin_data, str):
+            return cls.from_string(bin_data)
+        return cls.from_bits(bin_data)
+
+    def __len__(self):
+        return self.length
+
+    def __getstate__(self):
+        """
+        A pickled BitSequence (e.g. a sample sent to a process pool) only holds the bytes of its own bits, not the rest
+        of the buffer it is a view of
+        """
+        state = self.__dict__.copy()
+        state["packed"] = numpy.array(self.packed[:(self.offset + self.length + 7) // 8])
+        return state
+
+    def __repr__(self):
+        return "BitSequence(length=" + str(self.length) + ")"
+
+    def __getitem__(self, item):
+        """
+        Indexing a BitSequence returns a single bit (as an int), slicing it returns a view of the sequence
+        :param item: an index or a slice with a step of one
+        :return: an int or a BitSequence
+        """
+        if isinstance(item, slice):
+            start, stop, step = item.indices(self.length)
+            if step != 1:
+                raise ValueError("BitSequence slices must have a step of one")
+            return BitSequence(self.packed, max(stop - start, 0), self.offset + start)
+        if item < 0:
+            item += self.length
+        if not 0 <= item < self.length:
+            raise IndexError("BitSequence index out of range")
+        position = self.offset + item
+        return int(self.packed[position // 8] >> (7 - position % 8)) & 1
+
+    def unpack(self, start=0, stop=None):
+        """
+        This method unpacks a range of the sequence into a uint8 array with one element (0 or 1) per bit
+        :param start: the first bit to unpack
+        :param stop: one past the last bit to unpack, by default the end of the sequence
+        :return: a numpy uint8 array
+        """
+        if stop is None:
+            stop = self.length
+        stop = min(stop, self.length)
+        if stop <= start:
+            return numpy.zeros(0, dtype=numpy.uint8)
+        first, last = self.offset + start, self.offset + stop
+        bits = numpy.unpackbits(self.packed[first // 8:(last + 7) // 8])
+        return bits[first % 8:first % 8 + (stop - start)]
+
+    def chunks(self, chunk_size=None):
+        """
+        This method unpacks the sequence one chunk at a time so that long sequences can be processed in bounded memory
+        :param chunk_size: the number of bits in each chunk (the last chunk may be shorter)
+        :return: a generator of numpy uint8 arrays
+        """
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+        for start in range(0, self.length, chunk_size):
+            yield self.unpack(start, start + chunk_size)
+
+    def blocks(self, block_size, num_blocks=None):
+        """
+        This method unpacks the first num_blocks * block_size bits into a two dimensional array with one row per block
+        :param block_size: the number of bits in each block
+        :param num_blocks: the number of blocks, by default as many whole blocks as fit into the sequence
+        :return: a numpy uint8 array of shape (num_blocks, block_size)
+        """
+        if num_blocks is None:
+            num_blocks = self.length // block_size
+        return self.unpack(0, num_blocks * block_size).reshape(num_blocks, block_size)
+
+    def count_ones(self):
+        """
+        This method counts the number of ones in the sequence with a popcount over the packed bytes
+        :return: the number of ones
+        """
+        if self.length == 0:
+            return 0
+        end = self.offset + self.length
+        data = self.packed[:(end + 7) // 8]
+        ones = 0
+        for start in range(0, len(data), self.chunk_size // 8):
+            ones += int(popcount_table[data[start:start + self.chunk_size // 8]].sum(dtype=numpy.int64))
+        # Remove the bits in the first and last bytes which are not part of the sequence
+        ones -= int(popcount_table[int(data[0]) >> (8 - self.offset)])
+        ones -= int(popcount_table[int(data[-1]) & ((1 << (-end % 8)) - 1)])
+        return ones
+
+    def block_counts(self, block_size, num_blocks=None):
+        """
+        This method counts the number of ones in each of the non-overlapping blocks of the sequence
+        :param block_size: the number of bits in each block
+        :param num_blocks: the number of blocks, by default as many whole blocks as fit into the sequence
+        :return: a numpy int64 array with the number of ones in each block
+        """
+        if num_blocks is None:
+            num_blocks = self.length // block_size
+        if self.offset == 0 and block_size % 8 == 0:
+            # Byte aligned blocks can be counted without unpacking them
+            data = self.packed[:num_blocks * block_size // 8].reshape(num_blocks, block_size // 8)
+            return popcount_table[data].sum(axis=1, dtype=numpy.int64)
+        counts = numpy.zeros(num_blocks, dtype=numpy.int64)
+        step = max(1, self.chunk_size // block_size)
+        for first in range(0, num_blocks, step):
+            last = min(first + step, num_blocks)
+            blocks = self.unpack(first * block_size, last * block_size).reshape(last - first, block_size)
+            counts[first:last] = blocks.sum(axis=1, dtype=numpy.int64)
+        return counts
+
+    def block_count_histogram(self, block_size, num_blocks=None):
+        """
+        This method counts how many of the blocks contain exactly 0, 1, ..., block_size ones
+        :param block_size: the number of bits in each block
+        :param num_blocks: the number of blocks, by default as many whole blocks as fit into the sequence
+        :return: a numpy array of length block_size + 1
+        """
+        return numpy.bincount(self.block_counts(block_size, num_blocks), minlength=block_size + 1)
+
+    def transitions(self):
+        """
+        This method counts the number of positions at which a bit differs from the bit before it. The number of runs in
+        the sequence is one more than the number of transitions
+        :return: the number of transitions
+        """
+        count, previous = 0, None
+        for chunk in self.chunks():
+            count += int(numpy.count_nonzero(numpy.diff(chunk)))
+            if previous is not None and chunk[0] != previous:
+                count += 1
+            previous = chunk[-1]
+        return count
+
+    def longest_runs(self, block_size, num_blocks=None):
+        """
+        This method finds the length of the longest run of ones in each of the non-overlapping blocks of the sequence
+        :param block_size: the number of bits in each block
+        :param num_blocks: the number of blocks, by default as many whole blocks as fit into the sequence
+        :return: a numpy int64 array with the longest run of ones in each block
+        """
+        if num_blocks is None:
+            num_blocks = self.length // block_size
+        longest = numpy.zeros(num_blocks, dtype=numpy.int64)
+        step = max(1, self.chunk_size // block_size)
+        for first in range(0, num_blocks, step):
+            last = min(first + step, num_blocks)
+            # Surround every block with zeros so that runs start and end inside the block they belong to
+            padded = numpy.zeros((last - first, block_size + 2), dtype=numpy.int8)
+            padded[:, 1:-1] = self.unpack(first * block_size, last * block_size).reshape(last - first, block_size)
+            edges = numpy.diff(padded.reshape(-1))
+            starts = numpy.flatnonzero(edges == 1)
+            ends = numpy.flatnonzero(edges == -1)
+            numpy.maximum.at(longest, first + starts // (block_size + 2), ends - starts)
+        return longest
+
+    def signs(self, dtype=numpy.float32):
+        """
+        This method maps the sequence to an array of -1 (for a 0) and +1 (for a 1), unpacking one chunk at a time into
+        the output array so that no intermediate array the size of the whole sequence is created
+        :param dtype: the numpy data type of the output array
+        :return: a numpy array with one element per bit
+        """
+        out = numpy.empty(self.length, dtype=dtype)
+        for start in range(0, self.length, self.chunk_size):
+            chunk = self.unpack(start, start + self.chunk_size)
+            numpy.multiply(chunk, 2, out=out[start:start + len(chunk)], dtype=dtype)
+            out[start:start + len(chunk)] -= 1
+        return out
+
+    def walks(self):
+        """
+        This method yields the cumulative sum of the sequence after mapping 0 -> -1 and 1 -> +1, one chunk at a time.
+        The walk is summed in int32 and the running total is carried from one chunk into the next
+        :return: a generator of numpy int32 arrays holding the value of the walk after each bit
+        """
+        total = 0
+        for chunk in self.chunks():
+            walk = numpy.cumsum(chunk.astype(numpy.int32) * 2 - 1, dtype=numpy.int32)
+            walk += numpy.int32(total)
+            total = int(walk[-1])
+            yield walk
+
+    def longest_run_histogram(self, block_size, num_blocks=None):
+        """
+        This method counts how many of the blocks have a longest run of ones of length 0, 1, ..., block_size
+        :param block_size: the number of bits in each block
+        :param num_blocks: the number of blocks, by default as many whole blocks as fit into the sequence
+        :return: a numpy array of length block_size + 1
+        """
+        return numpy.bincount(self.longest_runs(block_size, num_blocks), minlength=block_size + 1)
+
+    def walk_extrema(self):
+        """
+        This method walks the cumulative sum of the sequence after mapping 0 -> -1 and 1 -> +1
+        :return: the final value, the minimum, and the maximum of the walk (including the origin)
+        """
+        total, minimum, maximum = 0, 0, 0
+        for walk in self.walks():
+            minimum = min(minimum, int(walk.min()))
+            maximum = max(maximum, int(walk.max()))
+            total = int(walk[-1])
+        return total, minimum, maximum
+
+    def walk_statistics(self):
+        """
+        This method computes everything the tests need from the cumulative sum of the sequence (after mapping 0 -> -1
+        and 1 -> +1) in a single pass over the walk:
+
+        total, minimum, maximum -> the final value and the extrema of the walk (including the origin)
+        cycles -> the number of cycles, where a cycle runs from one zero of the walk to the next with an extra zero
+                  before and after the walk (as in the Random Excursions test)
+        excursions -> an 8 x 6 array counting the cycles which visit each of the states -4 .. -1, +1 .. +4 exactly
+                      0, 1, 2, 3, 4 and 5 or more times
+        visits -> the number of times the walk visits each of the states -9 .. +9
+        :return: a dictionary containing the statistics
+        """
+        state = self.new_walk_state()
+        for walk in self.walks():
+            self.update_walk_state(state, walk)
+        return self.finish_walk_state(state)
+
+    @staticmethod
+    def new_walk_state():
+        """
+        This method creates the state which update_walk_state accumulates the walk statistics into
+        :return: a dictionary holding the state of a walk which has not taken any steps
+        """
+        return {"total": 0, "minimum": 0, "maximum": 0, "zeros": 0, "open cycle": numpy.zeros(8, dtype=numpy.int64),
+                "excursions": numpy.zeros((8, 6), dtype=numpy.int64), "visits": numpy.zeros(19, dtype=numpy.int64)}
+
+    @staticmethod
+    def update_walk_state(state, walk):
+        """
+        This method adds the next chunk of a walk to the walk state. The cycle of each step is the number of zeros
+        before it. Only the cycles which visit one of the states -4 .. +4 are stored, one row of visit counts each, and
+        the row of the cycle which is still open is carried in the state from one chunk of the walk into the next
+        :param state: the walk state, which is updated in place
+        :param walk: a numpy int32 array holding the value of the walk after each step of the chunk (not the change)
+        """
+        if len(walk) == 0:
+            return
+        state["minimum"] = min(state["minimum"], int(walk.min()))
+        state["maximum"] = max(state["maximum"], int(walk.max()))
+        state["total"] = int(walk[-1])
+        state["visits"] += numpy.bincount(walk[numpy.abs(walk) <= 9] + 9, minlength=19)
+        zeros = numpy.cumsum(walk == 0)
+        last_cycle = int(zeros[-1])
+        near = (numpy.abs(walk) <= 4) & (walk != 0)
+        cycle, visited = zeros[near], walk[near] + 4 - (walk[near] > 0)
+        # The cycle ids are sorted, so numbering the distinct ids gives each cycle with a visit a row
+        new_cycle = numpy.ones(len(cycle), dtype=bool)
+        new_cycle[1:] = cycle[1:] != cycle[:-1]
+        row = numpy.cumsum(new_cycle) - 1
+        cycle_ids = numpy.concatenate(([0], cycle[new_cycle]))
+        counts = numpy.bincount(row * 8 + visited, minlength=8 * int(new_cycle.sum())).reshape(-1, 8)
+        counts = numpy.concatenate((state["open cycle"][None, :], counts))
+        if len(cycle_ids) > 1 and cycle_ids[1] == 0:
+            counts[1] += counts[0]
+            cycle_ids, counts = cycle_ids[1:], counts[1:]
+        if cycle_ids[-1] == last_cycle:
+            state["open cycle"], counts = counts[-1].copy(), counts[:-1]
+        else:
+            state["open cycle"] = numpy.zeros(8, dtype=numpy.int64)
+        state["excursions"] += numpy.bincount((numpy.arange(8) * 6 + numpy.clip(counts, 0, 5)).ravel(),
+                                              minlength=48).reshape(8, 6)
+        state["zeros"] += last_cycle
+
+    @staticmethod
+    def finish_walk_state(state):
+        """
+        This method closes the cycle which is still open at the end of the walk and returns the walk statistics
+        :param state: the walk state
+        :return: a dictionary containing the statistics (see walk_statistics)
+        """
+        excursions = state["excursions"] + numpy.bincount(numpy.arange(8) * 6 + numpy.clip(state["open cycle"], 0, 5),
+                                                          minlength=48).reshape(8, 6)
+        # Every cycle which was not counted above visits the state zero times
+        num_cycles = state["zeros"] + 1
+        excursions[:, 0] = num_cycles - excursions[:, 1:].sum(axis=1)
+        return {"total": state["total"], "minimum": state["minimum"], "maximum": state["maximum"],
+                "cycles": num_cycles, "excursions": excursions, "visits": state["visits"].copy()}
+
+    def window_codes(self, width, start=0, stop=None, circular=False):
+        """
+        This method computes the code of every overlapping window of width bits which starts between start and stop.
+        The code of a window is the integer whose binary representation is the window (first bit most significant),
+        i.e. int(bin_data[i:i + width], 2). The codes are built with a rolling shift and OR over the unpacked bits.
+        :param width: the number of bits in each window (at most 64)
+        :param start: the position of the first window
+        :param stop: one past the position of the last window, by default the last window which fits in the sequence
+        :param circular: if true the windows wrap around from the end of the sequence to the start
+        :return: a numpy unsigned integer array with one code per window
+        """
+        if width > 64:
+            raise ValueError("Windows can be at most 64 bits wide", width)
+        dtype = numpy.uint64
+        for candidate in (numpy.uint8, numpy.uint16, numpy.uint32):
+            if width <= 8 * numpy.dtype(candidate).itemsize:
+                dtype = candidate
+                break
+        if stop is None:
+            stop = self.length if circular else self.length - width + 1
+        count = stop - start
+        if count <= 0:
+            return numpy.zeros(0, dtype=dtype)
+        bits = self.unpack(start, stop + width - 1)
+        if circular and len(bits) < count + width - 1:
+            wrap = count + width - 1 - len(bits)
+            if wrap <= self.length:
+                # Only the few bits which wrap around are copied, never the whole sequence
+                bits = numpy.concatenate((bits, self.unpack(0, wrap)))
+            else:
+                # The windows are wider than the sequence so they wrap around it more than once
+                bits = numpy.resize(numpy.concatenate((bits, self.unpack(0, start))), count + width - 1)
+        codes = numpy.zeros(count, dtype=dtype)
+        for k in range(width):
+            codes <<= dtype(1)
+            codes |= bits[k:k + count]
+        return codes
+
+    def block_codes(self, width, num_blocks=None):
+        """
+        This method computes the code of each of the non-overlapping blocks of width bits at the start of the sequence,
+        i.e. int(bin_data[i * width:(i + 1) * width], 2) for every block i
+        :param width: the number of bits in each block (at most 64)
+        :param num_blocks: the number of blocks, by default as many whole blocks as fit into the sequence
+        :return: a numpy unsigned integer array with one code per block
+        """
+        if width > 64:
+            raise ValueError("Blocks can be at most 64 bits wide", width)
+        dtype = numpy.uint64
+        for candidate in (numpy.uint8, numpy.uint16, numpy.uint32):
+            if width <= 8 * numpy.dtype(candidate).itemsize:
+                dtype = candidate
+                break
+        bits = self.blocks(width, num_blocks)
+        codes = numpy.zeros(len(bits), dtype=dtype)
+        for k in range(width):
+            codes <<= dtype(1)
+            codes |= bits[:, k]
+        return codes
+
+    def block_window_codes(self, width, block_size, num_blocks=None):
+        """
+        This method computes the codes of the overlapping windows which fit entirely inside each of the non-overlapping
+        blocks of the sequence. The codes are computed once for the whole sequence and each row of the result is a
+        strided view of the codes which start in that block, so no code is copied.
+        :param width: the number of bits in each window
+        :param block_size: the number of bits in each block
+        :param num_blocks: the number of blocks, by default as many whole blocks as fit into the sequence
+        :return: a numpy array of shape (num_blocks, block_size - width + 1) with the codes of the windows in each block
+        """
+        if num_blocks is None:
+            num_blocks = self.length // block_size
+        windows = max(block_size - width + 1, 0)
+        codes = self.window_codes(width, 0, max(num_blocks * block_size - width + 1, 0))
+        if windows == 0 or num_blocks == 0:
+            return numpy.zeros((num_blocks, windows), dtype=codes.dtype)
+        return numpy.lib.stride_tricks.as_strided(codes, shape=(num_blocks, windows),
+                                                  strides=(block_size * codes.itemsize, codes.itemsize),
+                                                  writeable=False)
+
+    def pattern_counts(self, width):
+        """
+        This method counts how often each of the 2^width patterns appears in the overlapping windows of the sequence.
+        The windows wrap around the end of the sequence so there is one window per bit (as in the Serial and Approximate
+        Entropy tests). Shorter patterns can be counted by folding the result with fold_pattern_counts.
+        :param width: the number of bits in each pattern
+        :return: a numpy int64 array of length 2^width indexed by the pattern code
+        """
+        counts = numpy.zeros(pow(2, width), dtype=numpy.int64)
+        for start in range(0, self.length, self.chunk_size):
+            codes = self.window_codes(width, start, min(start + self.chunk_size, self.length), circular=True)
+            counts += numpy.bincount(codes, minlength=len(counts))
+        return counts
+
+    @staticmethod
+    def fold_pattern_counts(counts, width):
+        """
+        This method turns the counts of circular windows of some width into the counts of circular windows of a smaller
+        width. The code of the shorter window is the code of the longer window without its last bits, so each count of
+        the shorter window is the sum of a group of consecutive counts of the longer window.
+        :param counts: the counts returned by pattern_counts
+        :param width: the width of the shorter windows
+        :return: a numpy int64 array of length 2^width
+        """
+        return counts.reshape(pow(2, width), -1).sum(axis=1)
+
+    def digest(self):
+        """
+        This method hashes the bits of the sequence (and its length). Two sequences with the same bits have the same
+        digest, however they are stored (e.g. a view which starts in the middle of a byte and a packed copy of it)
+        :return: a bytes object of 20 bytes
+        """
+        digest = hashlib.blake2b(str(self.length).encode("ascii"), digest_size=20)
+        if self.offset == 0:
+            # The bytes can be hashed as they are, apart from the unused bits of the last byte
+            digest.update(numpy.ascontiguousarray(self.packed[:self.length // 8]).data)
+            if self.length % 8:
+                digest.update(bytes([int(self.packed[self.length // 8]) & (0xFF << (8 - self.length % 8)) & 0xFF]))
+        else:
+            for chunk in self.chunks():
+                digest.update(numpy.packbits(chunk).data)
+        return digest.digest()
+
+    def to_string(self):
+        """
+        This method converts the sequence back into a string of '0' and '1' characters
+        :return: a binary string
+        """
+        return "".join([(chunk + ord('0')).tobytes().decode("ascii") for chunk in self.chunks()])
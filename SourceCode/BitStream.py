@@ -0,0 +1,178 @@
+import numpy
+
+from SourceCode.BitSequence import BitSequence
+
+
+class BitStream(BitSequence):
+    def __init__(self, block_sizes=(128,), pattern_length=16):
+        """
+        A BitStream is a BitSequence which never holds its bits. It is fed a long sequence one chunk at a time (e.g.
+        reading a multi-gigabyte capture from an RNG) and every chunk is folded into a set of accumulators which are
+        all the tests need: the number of ones, the number of transitions, the histograms of the number of ones and of
+        the longest run of ones in the blocks, the overlapping pattern counts, and the state of the cumulative sum walk.
+        Whatever straddles a chunk boundary (an unfinished block, the last few bits of a pattern, the open cycle of the
+        walk) is carried into the next chunk, so the result does not depend on how the sequence was chunked.
+
+        Once the sequence has been fed in, the BitStream can be passed to the Monobit, Block Frequency, Independent
+        Runs, Longest Runs, Serial, Approximate Entropy, Cumulative Sums and both Random Excursions tests just like any
+        other BitSequence. The remaining tests need the whole sequence at once and raise an error if they are given a stream.
+        :param block_sizes: the block sizes which the Block Frequency test will be run with
+        :param pattern_length: the widest overlapping pattern to count (the Serial test with pattern_length m needs m,
+        the Approximate Entropy test needs m + 1)
+        :return: a BitStream object
+        """
+        BitSequence.__init__(self, numpy.zeros(0, dtype=numpy.uint8), 0)
+        self.pattern_length = pattern_length
+        self.ones = 0
+        self.num_transitions = 0
+        self.last_bit = None
+        self.count_histograms = {m: numpy.zeros(m + 1, dtype=numpy.int64) for m in block_sizes}
+        # The Longest Runs test picks its block size from the length of the sequence, which is only known at the end,
+        # so every block size it may pick is counted until the sequence is too long for it to be picked
+        self.run_histograms = {m: numpy.zeros(m + 1, dtype=numpy.int64) for m in (8, 128, 10000)}
+        self.pending = {m: numpy.zeros(0, dtype=numpy.uint8) for m in set(block_sizes) | {8, 128, 10000}}
+        # The first and (so far) last pattern_length - 1 bits, the windows which wrap around are counted at the end
+        self.head = numpy.zeros(0, dtype=numpy.uint8)
+        self.tail = numpy.zeros(0, dtype=numpy.uint8)
+        self.patterns = numpy.zeros(2 ** pattern_length, dtype=numpy.int64)
+        self.walk_state = self.new_walk_state()
+
+    @classmethod
+    def from_chunks(cls, chunks, block_sizes=(128,), pattern_length=16):
+        """
+        This method feeds every chunk from an iterator into a new BitStream
+        :param chunks: an iterable of chunks (see update)
+        :param block_sizes: the block sizes which the Block Frequency test will be run with
+        :param pattern_length: the widest overlapping pattern to count
+        :return: a BitStream
+        """
+        stream = cls(block_sizes, pattern_length)
+        for chunk in chunks:
+            stream.update(chunk)
+        return stream
+
+    def __repr__(self):
+        return "BitStream(length=" + str(self.length) + ")"
+
+    def update(self, chunk):
+        """
+        This method folds the next chunk of the sequence into the accumulators. Chunks are processed chunk_size bits at
+        a time so a big chunk does not need a big amount of memory
+        :param chunk: raw bytes (eight bits to a byte, first bit most significant), a BitSequence, a binary string, or
+        an array of zeros and ones
+        """
+        if isinstance(chunk, (bytes, bytearray, memoryview)):
+            chunk = BitSequence.from_bytes(chunk)
+        else:
+            chunk = BitSequence.convert(chunk)
+        for bits in chunk.chunks():
+            self.update_bits(bits)
+
+    def update_bits(self, bits):
+        """
+        This method folds an array of unpacked bits (the next bits of the sequence) into the accumulators
+        :param bits: a numpy uint8 array of zeros and ones
+        """
+        if len(bits) == 0:
+            return
+        self.ones += int(numpy.count_nonzero(bits))
+        # The transition from the last bit of the previous chunk to the first bit of this one
+        if self.last_bit is not None:
+            self.num_transitions += int(self.last_bit != bits[0])
+        self.num_transitions += int(numpy.count_nonzero(bits[1:] != bits[:-1]))
+        self.last_bit = int(bits[-1])
+
+        for m in list(self.pending):
+            data = numpy.concatenate((self.pending[m], bits))
+            blocks = BitSequence.from_bits(data[:len(data) - len(data) % m])
+            if m in self.count_histograms:
+                self.count_histograms[m] += blocks.block_count_histogram(m)
+            if m in self.run_histograms:
+                self.run_histograms[m] += blocks.longest_run_histogram(m)
+            self.pending[m] = data[len(data) - len(data) % m:]
+
+        width = self.pattern_length
+        if len(self.head) < width - 1:
+            self.head = numpy.concatenate((self.head, bits[:width - 1 - len(self.head)]))
+        data = numpy.concatenate((self.tail, bits))
+        codes = BitSequence.from_bits(data).window_codes(width)
+        self.patterns += numpy.bincount(codes, minlength=2 ** width)
+        self.tail = data[max(len(data) - (width - 1), 0):]
+
+        walk = numpy.cumsum(bits.astype(numpy.int32) * 2 - 1, dtype=numpy.int32)
+        walk += numpy.int32(self.walk_state["total"])
+        self.update_walk_state(self.walk_state, walk)
+        self.length += len(bits)
+
+        # These are the lengths at which the Longest Runs test stops using blocks of 8 and of 128 bits
+        for m, longest in ((8, 6272), (128, 75000)):
+            if self.length >= longest and m in self.run_histograms:
+                del self.run_histograms[m]
+                if m not in self.count_histograms:
+                    del self.pending[m]
+
+    def __getitem__(self, item):
+        """
+        The bits of a stream are not kept, so the tests which need them can not be run on a stream
+        """
+        raise ValueError("A BitStream does not keep its bits, this test can not be run on a stream")
+
+    def unpack(self, start=0, stop=None):
+        """
+        The bits of a stream are not kept, so the tests which need them can not be run on a stream
+        """
+        raise ValueError("A BitStream does not keep its bits, this test can not be run on a stream")
+
+    def count_ones(self):
+        """
+        This method returns the number of ones counted so far
+        """
+        return self.ones
+
+    def transitions(self):
+        """
+        This method returns the number of transitions counted so far (including those across chunk boundaries)
+        """
+        return self.num_transitions
+
+    def block_count_histogram(self, block_size, num_blocks=None):
+        """
+        This method returns the histogram of the number of ones in the whole blocks seen so far
+        """
+        if block_size not in self.count_histograms:
+            raise ValueError("The stream did not count blocks of this size", block_size)
+        return self.count_histograms[block_size]
+
+    def longest_run_histogram(self, block_size, num_blocks=None):
+        """
+        This method returns the histogram of the longest run of ones in the whole blocks seen so far
+        """
+        if block_size not in self.run_histograms:
+            raise ValueError("The stream did not count blocks of this size", block_size)
+        return self.run_histograms[block_size]
+
+    def walk_statistics(self):
+        """
+        This method returns the statistics of the walk so far, as if the sequence ended here
+        """
+        return self.finish_walk_state(self.walk_state)
+
+    def walk_extrema(self):
+        """
+        This method returns the final value and the extrema of the walk so far
+        """
+        return self.walk_state["total"], self.walk_state["minimum"], self.walk_state["maximum"]
+
+    def pattern_counts(self, width):
+        """
+        This method counts the overlapping patterns of the given width with the windows wrapping around the end of the
+        sequence. The windows which wrap around start in the last width - 1 bits and end in the first width - 1 bits,
+        so they are counted here from the tail and head which the stream kept
+        :param width: the number of bits in each pattern, at most the pattern_length of the stream
+        :return: a numpy array with the count of each of the 2^width patterns
+        """
+        if width > self.pattern_length:
+            raise ValueError("The stream only counted patterns of up to", self.pattern_length, "bits")
+        wrapped = BitSequence.from_bits(numpy.concatenate((self.tail, self.head))).window_codes(self.pattern_length)
+        counts = self.patterns + numpy.bincount(wrapped, minlength=2 ** self.pattern_length)
+        return self.fold_pattern_counts(counts, width)
@@ -1,84 +1,225 @@
+import io
 import os
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import concurrent.futures
 import Quandl
 import pandas
 
+from SourceCode.MarketCache import MarketCache
+from SourceCode.Instruments import Instruments
+
 
 class QuandlInterface:
-    def __init__(self, api_key):
+    def __init__(self, api_key, instruments=None, cache=None, workers=4, retries=5, backoff=1.0, api_url=None):
         """
         An interface for downloading data from Quandl
         :param api_key: [YOUR API KEY] (taken from the .private.csv file)
+        :param instruments: an Instruments object which measures the fetching of each data set (None to not measure)
+        :param cache: the MarketCache to keep downloaded data sets in, by default one in MarketData/Columnar
+        :param workers: the most data sets which are downloaded at the same time
+        :param retries: the number of times a download is retried when Quandl says the call limit was exceeded
+        :param backoff: the seconds to wait before the first retry, the wait doubles after each retry
+        :param api_url: the URL of the Quandl API (e.g. http://127.0.0.1:8000/api/v3) to download the CSV files from
+        directly instead of through the Quandl package, which is useful for testing against a local server
         """
         self.api_key = api_key
+        self.instruments = instruments
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.api_url = api_url
+        self.basepath = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, "MarketData"))
+        if cache is None:
+            cache = MarketCache(os.path.join(self.basepath, "Columnar"))
+        self.cache = cache
 
     def get_data_set(self, argument):
-        file_name = argument.to_string()
-        basepath = os.path.dirname(__file__)
-        path = os.path.abspath(os.path.join(basepath, os.pardir, "MarketData", file_name))
-        try:
-            data_frame = pandas.read_csv(path)
-            data_frame = data_frame.set_index("Date")
-            return data_frame
-        except:
-            data_frame = self.download_data_set(argument)
-            data_frame.to_csv(path, mode="w+")
+        """
+        This method loads a data set from the cache. If the cache does not have all of the dates the argument asks for,
+        only the missing dates are downloaded and merged into the cache. A series which is not in the cache at all is
+        first loaded from the widest CSV file it was cached in by older versions (if there is one). The cache keeps
+        every column of the data sets it downloads, the columns the argument drops are only left out when it is loaded
+        :param argument: an argument object which contains the information to construct the request
+        :return: a pandas DataFrame containing the data
+        """
+        data_frame = self.cache.get(argument)
+        if data_frame is not None:
             return data_frame
+        if self.cache.get_key(argument) not in self.cache.manifest:
+            legacy = self.load_legacy_data_set(argument)
+            if legacy is not None:
+                # The CSV files were written after the argument's columns had been dropped
+                self.cache.put(*legacy, dropped=argument.drop)
+        try:
+            for start, end in self.cache.get_missing(argument):
+                part = Argument(argument.id, start, end, argument.prefix, argument.drop,
+                                argument.transformation, argument.collapse)
+                self.cache.put(part, self.download_data_set(part, drop=False))
+        except ValueError:
+            # The columns of the series have changed since it was stored, so all of it is fetched again
+            start, end = self.cache.get_range(argument)
+            part = Argument(argument.id, start, end, argument.prefix, argument.drop,
+                            argument.transformation, argument.collapse)
+            self.cache.put(part, self.download_data_set(part, drop=False))
+        # Load it back so that the data set looks the same (e.g. has the same index) however it was found
+        return self.cache.get(argument)
 
-    def download_data_set(self, argument):
+    def load_legacy_data_set(self, argument):
         """
-        This method tries to fetch a data set from Quandl
+        This method looks for the series of an argument among the CSV files older versions cached data sets in, which
+        were named after their range of dates (see Argument.to_string), and loads the one covering the most dates
         :param argument: an argument object which contains the information to construct the request
+        :return: an (Argument, pandas DataFrame) pair for the range of dates in the file, or None if there is no file
+        """
+        if argument.collapse not in (None, "none"):
+            # The file names do not say how the data was collapsed
+            return None
+        name = Argument(argument.id, "", "", rdiff=argument.transformation).to_string()
+        prefix, suffix = name.split(" start=")[0] + " start=", " trans=" + name.split(" trans=")[-1]
+        ranges = []
+        try:
+            file_names = os.listdir(self.basepath)
+        except OSError:
+            return None
+        for file_name in file_names:
+            if file_name.startswith(prefix) and file_name.endswith(suffix):
+                dates = file_name[len(prefix):-len(suffix)].split(" end=")
+                try:
+                    days = (pandas.Timestamp(dates[1]) - pandas.Timestamp(dates[0])).days
+                except (IndexError, ValueError):
+                    continue
+                ranges.append((days, dates[0], dates[1], file_name))
+        for days, start, end, file_name in sorted(ranges, reverse=True):
+            try:
+                data_frame = pandas.read_csv(os.path.join(self.basepath, file_name))
+                data_frame = data_frame.set_index("Date")
+            except (OSError, ValueError, KeyError):
+                continue
+            return Argument(argument.id, start, end, argument.prefix, argument.drop,
+                            argument.transformation, argument.collapse), data_frame
+        return None
+
+    def download_data_set(self, argument, drop=True):
+        """
+        This method tries to fetch a data set from Quandl. If Quandl says the call limit was exceeded the download is
+        retried after waiting backoff seconds, then twice as long, and so on up to retries times
+        :param argument: an argument object which contains the information to construct the request
+        :param drop: whether to drop the argument's drop columns from the data set
         :return: a pandas DataFrame containing the data
         """
         assert isinstance(argument, Argument)
         data_frame = None
-        try:
-            data_set_name = argument.id
-            if argument.prefix is not None:
-                data_set_name = argument.prefix + data_set_name
-            data_frame = Quandl.get(data_set_name, authtoken=self.api_key,
-                                    trim_start=argument.start, trim_end=argument.end,
-                                    transformation=argument.transformation, collapse=argument.collapse)
-            assert isinstance(data_frame, pandas.DataFrame)
-            for d in argument.drop:
-                try:
-                    data_frame = data_frame.drop(d, axis=1)
-                except:
+        data_set_name = argument.id
+        if argument.prefix is not None:
+            data_set_name = argument.prefix + data_set_name
+        for attempt in range(self.retries + 1):
+            try:
+                if self.api_url is not None:
+                    data_frame = self.request_data_set(data_set_name, argument)
+                else:
+                    data_frame = Quandl.get(data_set_name, authtoken=self.api_key,
+                                            trim_start=argument.start, trim_end=argument.end,
+                                            transformation=argument.transformation, collapse=argument.collapse)
+                assert isinstance(data_frame, pandas.DataFrame)
+                for d in argument.drop if drop else []:
+                    try:
+                        data_frame = data_frame.drop(d, axis=1)
+                    except:
+                        continue
+            except Quandl.DatasetNotFound:
+                print("Data set not found")
+            except Quandl.ErrorDownloading:
+                print("Error downloading")
+            except Quandl.ParsingError:
+                print("Parsing error")
+            except Quandl.WrongFormat:
+                print("Wrong format")
+            except Quandl.CallLimitExceeded:
+                print("Call limit exceeded")
+                if attempt < self.retries:
+                    time.sleep(self.backoff * 2 ** attempt)
                     continue
-        except Quandl.DatasetNotFound:
-            print("Data set not found")
-        except Quandl.ErrorDownloading:
-            print("Error downloading")
-        except Quandl.ParsingError:
-            print("Parsing error")
-        except Quandl.WrongFormat:
-            print("Wrong format")
-        except Quandl.CallLimitExceeded:
-            print("Call limit exceeded")
-        except Quandl.CodeFormatError:
-            print("Code format error")
-        except Quandl.MissingToken:
-            print("Missing token")
+            except Quandl.CodeFormatError:
+                print("Code format error")
+            except Quandl.MissingToken:
+                print("Missing token")
+            break
         if data_frame is None:
             raise Exception("Data Set Not Initialized", argument.id)
         else:
             return data_frame
 
+    def request_data_set(self, data_set_name, argument):
+        """
+        This method downloads a data set as a CSV file from the Quandl API at api_url. HTTP errors are raised as the
+        same exceptions the Quandl package raises e.g. a 429 (too many requests) response raises CallLimitExceeded
+        :param data_set_name: the code of the data set including its database prefix e.g. YAHOO/INDEX_AEX
+        :param argument: an argument object which contains the information to construct the request
+        :return: a pandas DataFrame containing the data
+        """
+        query = {"start_date": argument.start, "end_date": argument.end}
+        if argument.transformation not in (None, "none"):
+            query["transformation"] = argument.transformation
+        if argument.collapse not in (None, "none"):
+            query["collapse"] = argument.collapse
+        if self.api_key:
+            query["api_key"] = self.api_key
+        url = self.api_url.rstrip("/") + "/datasets/" + urllib.parse.quote(data_set_name) + ".csv?"
+        try:
+            with urllib.request.urlopen(url + urllib.parse.urlencode(query), timeout=60) as response:
+                body = response.read()
+        except urllib.error.HTTPError as error:
+            if error.code == 429:
+                raise Quandl.CallLimitExceeded()
+            if error.code == 404:
+                raise Quandl.DatasetNotFound()
+            raise Quandl.ErrorDownloading()
+        except OSError:
+            raise Quandl.ErrorDownloading()
+        try:
+            data_frame = pandas.read_csv(io.BytesIO(body), index_col=0, parse_dates=True)
+        except ValueError:
+            raise Quandl.ParsingError()
+        data_frame.index.name = "Date"
+        return data_frame
+
     def get_data_sets(self, arguments):
         """
-        This method just calls the get_data_set() method to download and join various data sets
+        This method calls the get_data_set() method to download and join various data sets. The series which are not
+        in the cache are downloaded at the same time by up to workers threads, arguments which ask for the same series
+        (whatever their dates or columns) are fetched together so each missing date is only downloaded once, and the
+        data sets are joined in the order of the arguments
         :param arguments: a list of Argument objects
         :return: a pandas DataFrame
         """
         # assert isinstance(arguments, [Argument])
-        combined_data_frame = None
+        data_frames = {}
+        series = {}
         for arg in arguments:
             assert isinstance(arg, Argument)
-            arg_data_frame = self.get_data_set(arg)
+            key = self.get_request_key(arg)
+            if key in data_frames:
+                continue
+            data_frames[key] = None
+            if self.cache.contains(arg):
+                data_frames[key] = self.fetch_data_set(arg)
+            else:
+                series.setdefault(self.cache.get_key(arg), []).append(arg)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(self.workers, 1)) as executor:
+            futures = [executor.submit(self.fetch_series, series_arguments) for series_arguments in series.values()]
+            for future in futures:
+                data_frames.update(future.result())
+        combined_data_frame = None
+        for arg in arguments:
+            arg_data_frame = data_frames[self.get_request_key(arg)]
             new_columns = []
             for i in range(len(arg_data_frame.columns)):
                 new_columns.append(arg.id + "_" + arg_data_frame.columns[i])
-            arg_data_frame.columns = new_columns
+            # Rename a copy, the same data frame is shared by every argument which asked for it
+            arg_data_frame = arg_data_frame.set_axis(new_columns, axis=1)
             if combined_data_frame is None:
                 combined_data_frame = arg_data_frame
             else:
@@ -86,6 +227,50 @@ class QuandlInterface:
         combined_data_frame = combined_data_frame.dropna()
         return combined_data_frame
 
+    def get_request_key(self, argument):
+        """
+        This method names what an argument asks for, i.e. its series (see MarketCache.get_key), dates and columns
+        :param argument: an argument object which contains the information to construct the request
+        :return: a tuple which is the same for two arguments if and only if they get the same data set
+        """
+        return self.cache.get_key(argument), argument.start, argument.end, tuple(argument.drop)
+
+    def fetch_series(self, arguments):
+        """
+        This method gets the data sets of arguments which all ask for the same series. The range of dates covering all
+        of them is fetched once (see get_data_set), so only its missing dates are downloaded, and then each argument
+        is loaded from the cache
+        :param arguments: a list of Argument objects with the same series
+        :return: a dictionary mapping the request key of each argument (see get_request_key) to its data set
+        """
+        first = arguments[0]
+        if len(arguments) == 1:
+            return {self.get_request_key(first): self.fetch_data_set(first)}
+        # Only the columns which none of the arguments want can be left out of the cache
+        drop = [d for d in first.drop if all(d in arg.drop for arg in arguments)]
+        covering = Argument(first.id, min(arg.start for arg in arguments), max(arg.end for arg in arguments),
+                            first.prefix, drop, first.transformation, first.collapse)
+        self.fetch_data_set(covering)
+        data_frames = {}
+        for arg in arguments:
+            data_frame = self.cache.get(arg)
+            if data_frame is None:
+                data_frame = self.get_data_set(arg)
+            data_frames[self.get_request_key(arg)] = data_frame
+        return data_frames
+
+    def fetch_data_set(self, argument):
+        """
+        This method gets one data set (see get_data_set), measuring it if the interface has instruments
+        :param argument: an argument object which contains the information to construct the request
+        :return: a pandas DataFrame containing the data
+        """
+        with Instruments.maybe_measure(self.instruments, "download", argument.id) as record:
+            data_frame = self.get_data_set(argument)
+            if record is not None:
+                record["bytes"] = int(data_frame.memory_usage().sum())
+        return data_frame
+
 
 class Argument:
     def __init__(self, id, start, end, prefix=None, drop=None, rdiff="none", collapse="none"):
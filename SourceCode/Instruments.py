@@ -0,0 +1,201 @@
+import contextlib
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+
+
+class Instruments:
+    def __init__(self, trace_memory=False):
+        """
+        An Instruments object collects measurements of the stages of a run: each test in the RandomnessTester, each
+        column converted by a BinaryFrame and each data set fetched by a QuandlInterface. Every measurement is a record
+        holding the stage, the name of what was measured, the wall time, the CPU time, the number of bytes processed
+        and (if memory is traced) the peak memory allocated while it ran. Pass the same Instruments object to each of
+        those classes and print a summary at the end of the run to see where the time went.
+
+        Callbacks can be added to do something with each record as it is made (e.g. log it), and a single function can
+        be captured in detail with cProfile and tracemalloc using the profile method.
+        :param trace_memory: whether to trace the peak memory of every measurement with tracemalloc. This slows down
+        allocation heavy code (sometimes by a factor of two or more), so the times are less accurate when it is on
+        :return: an Instruments object
+        """
+        self.trace_memory = trace_memory
+        self.records = []
+        self.callbacks = []
+        self.profiles = {}
+        # The peak memory of each open measurement in each thread, nested measurements pass their peak on to the one
+        # around them. Only the main thread traces memory (see measure)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.open = 0
+        self.started = False
+
+    def get_peaks(self):
+        """
+        This method returns the stack of open measurements of the current thread
+        """
+        if not hasattr(self.local, "peaks"):
+            self.local.peaks = []
+        return self.local.peaks
+
+    def add_callback(self, callback):
+        """
+        This method adds a function which is called with each record as soon as it is made
+        :param callback: a function which takes one argument, the record (a dictionary)
+        """
+        self.callbacks.append(callback)
+
+    def add_record(self, record):
+        """
+        This method stores a record and passes it to the callbacks. It is used to add the records which were made in
+        another process (e.g. by the workers of the test suite)
+        :param record: a record (a dictionary with the keys stage, name, wall, cpu, bytes and peak)
+        """
+        with self.lock:
+            self.records.append(record)
+        for callback in self.callbacks:
+            callback(record)
+
+    @contextlib.contextmanager
+    def measure(self, stage, name, num_bytes=0):
+        """
+        This method measures the code which runs inside a with statement e.g.
+
+        with instruments.measure("test", "monobit", len(bin_data) // 8):
+            p_val = rng_tester.monobit(bin_data)
+
+        The record is yielded so that the number of bytes can be filled in if it is only known at the end. Memory is
+        only traced in the main thread: tracemalloc has one peak for the whole process, so measurements which run at
+        the same time in other threads (e.g. the downloads of QuandlInterface.get_data_sets) would reset each other's
+        peaks. Their records have no peak, and their CPU time is the time of their own thread. The peak of a measurement
+        in the main thread still includes the memory which other threads allocated while it ran
+        :param stage: the stage of the run e.g. "test", "convert" or "download"
+        :param name: the name of what is being measured e.g. the name of the test
+        :param num_bytes: the number of bytes processed
+        :return: the record of the measurement
+        """
+        record = {"stage": stage, "name": name, "wall": 0.0, "cpu": 0.0, "bytes": num_bytes, "peak": None}
+        main = threading.current_thread() is threading.main_thread()
+        tracing = self.trace_memory and main
+        peaks = self.get_peaks()
+        if tracing:
+            with self.lock:
+                # Tracing is started by the first open measurement and stopped by the last (unless it was already on)
+                if self.open == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self.started = True
+                self.open += 1
+            current, peak = tracemalloc.get_traced_memory()
+            # The peak so far belongs to the measurement around this one (if there is one)
+            if peaks:
+                peaks[-1] = max(peaks[-1], peak)
+            tracemalloc.reset_peak()
+            peaks.append(current)
+        cpu_time = time.process_time if main else time.thread_time
+        wall, cpu = time.perf_counter(), cpu_time()
+        try:
+            yield record
+        finally:
+            record["wall"] = time.perf_counter() - wall
+            record["cpu"] = cpu_time() - cpu
+            if tracing:
+                peak = max(peaks.pop(), tracemalloc.get_traced_memory()[1])
+                record["peak"] = max(peak - current, 0)
+                if peaks:
+                    peaks[-1] = max(peaks[-1], peak)
+                with self.lock:
+                    self.open -= 1
+                    if self.open == 0 and self.started:
+                        tracemalloc.stop()
+                        self.started = False
+            self.add_record(record)
+
+    @staticmethod
+    def maybe_measure(instruments, stage, name, num_bytes=0):
+        """
+        This method measures the code inside a with statement if there are instruments and does nothing if there are
+        not, so that the classes which take an optional Instruments object (e.g. BinaryFrame) can always use a with
+        :param instruments: an Instruments object, or None
+        :param stage: the stage of the run e.g. "convert" or "download"
+        :param name: the name of what is being measured
+        :param num_bytes: the number of bytes processed
+        :return: a context manager for a with statement, which yields the record (or None without instruments)
+        """
+        if instruments is None:
+            return contextlib.nullcontext()
+        return instruments.measure(stage, name, num_bytes)
+
+    def profile(self, function, *args, limit=25, **kwargs):
+        """
+        This method runs one function (e.g. one test on one sample) under cProfile and tracemalloc and keeps a report
+        of the functions it spent the most time in, the peak memory it allocated and the lines which still held the
+        most memory when it returned
+        :param function: the function to profile
+        :param limit: the number of functions and lines to include in the report
+        :return: the result of the function. The report is stored in self.profiles under the name of the function
+        """
+        profiler = cProfile.Profile()
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        try:
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            profiler.enable()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                profiler.disable()
+            peak = tracemalloc.get_traced_memory()[1] - current
+            snapshot = tracemalloc.take_snapshot()
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(limit)
+        report.write("Peak allocation {0:.1f} MiB, memory still allocated when it returned\n".format(peak / 2 ** 20))
+        for statistic in snapshot.statistics("lineno")[:limit]:
+            report.write(str(statistic) + "\n")
+        self.profiles[getattr(function, "__name__", str(function))] = report.getvalue()
+        return result
+
+    def summary(self):
+        """
+        This method totals the records of each (stage, name) pair
+        :return: a dictionary mapping (stage, name) to a dictionary with the number of calls, the total wall time, CPU
+        time and bytes, and the largest peak memory
+        """
+        totals = {}
+        for record in self.records:
+            key = (record["stage"], record["name"])
+            if key not in totals:
+                totals[key] = {"calls": 0, "wall": 0.0, "cpu": 0.0, "bytes": 0, "peak": None}
+            total = totals[key]
+            total["calls"] += 1
+            total["wall"] += record["wall"]
+            total["cpu"] += record["cpu"]
+            total["bytes"] += record["bytes"]
+            if record["peak"] is not None:
+                total["peak"] = max(total["peak"] or 0, record["peak"])
+        return totals
+
+    def print_summary(self):
+        """
+        This method prints the summary to the console, slowest first, along with the share of the wall time of each
+        """
+        totals = self.summary()
+        wall = sum(total["wall"] for total in totals.values()) or 1.0
+        print("\n\t" + "stage".ljust(10) + "name".ljust(36) + "calls".rjust(7) + "wall (s)".rjust(11) +
+              "cpu (s)".rjust(11) + "share".rjust(8) + "MB/s".rjust(11) + "peak (MiB)".rjust(12))
+        for (stage, name), total in sorted(totals.items(), key=lambda item: -item[1]["wall"]):
+            rate = total["bytes"] / total["wall"] / 1e6 if total["wall"] > 0 else 0.0
+            peak = "-" if total["peak"] is None else "{0:.1f}".format(total["peak"] / 2 ** 20)
+            print("\t" + stage.ljust(10) + str(name).ljust(36) + str(total["calls"]).rjust(7) +
+                  "{0:11.3f}{1:11.3f}{2:7.1f}%{3:11.2f}".format(total["wall"], total["cpu"],
+                                                               100 * total["wall"] / wall, rate) + peak.rjust(12))
+        if self.trace_memory and any(total["peak"] is None for total in totals.values()):
+            print("\tPeaks shown as - were measured outside the main thread (e.g. concurrent downloads), where memory "
+                  "is not traced")
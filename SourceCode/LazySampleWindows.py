@@ -0,0 +1,65 @@
+import collections
+import numpy
+
+from SourceCode.BitSequence import BitSequence
+
+
+class LazySampleWindows:
+    def __init__(self, values, firsts, days, encode, cache_size=2):
+        """
+        A LazySampleWindows object is the list of samples of one column of a BinaryFrame which is converted lazily: it
+        holds the (unconverted) values of the column and converts the days of a sample into bits only when the sample
+        is asked for. The test suite asks for one sample at a time, so only the samples being tested are ever held in
+        memory however many columns the frame has. The most recently used samples are kept in a small least recently
+        used cache so that asking for the same sample again does not convert it again.
+
+        Overlapping samples share days which are converted again for each sample, so a lazy frame trades conversion
+        time for memory. Use a SampleWindows object (the default, see BinaryFrame.convert) if the samples fit in memory
+        :param values: a one dimensional numpy array with the value of each day
+        :param firsts: the index of the first day of each sample
+        :param days: the number of days in each sample
+        :param encode: a function which takes an array of values and returns their bits and the bits of each value
+        :param cache_size: the number of converted samples to keep
+        :return: a LazySampleWindows object
+        """
+        self.values = values
+        self.firsts = numpy.asarray(firsts, dtype=numpy.int64)
+        self.days = days
+        self.encode = encode
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.firsts)
+
+    def __repr__(self):
+        return "LazySampleWindows(windows=" + str(len(self)) + ", cached=" + str(len(self.cache)) + ")"
+
+    def __getitem__(self, item):
+        """
+        Indexing converts the sample (unless it is in the cache), slicing returns a LazySampleWindows object of those
+        samples which has a cache of its own
+        :param item: an index or a slice
+        :return: a BitSequence or a LazySampleWindows object
+        """
+        if isinstance(item, slice):
+            return LazySampleWindows(self.values, self.firsts[item], self.days, self.encode, self.cache_size)
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("LazySampleWindows index out of range")
+        if item in self.cache:
+            self.cache.move_to_end(item)
+            return self.cache[item]
+        first = int(self.firsts[item])
+        bits, lengths = self.encode(self.values[first:first + self.days])
+        sample = BitSequence.from_bits(bits)
+        if self.cache_size > 0:
+            self.cache[item] = sample
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return sample
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
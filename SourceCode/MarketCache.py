@@ -0,0 +1,201 @@
+import os
+import json
+import numpy
+import pandas
+import shutil
+import threading
+
+
+class MarketCache:
+    def __init__(self, directory):
+        """
+        A MarketCache stores the data sets downloaded from Quandl in a binary columnar format. Every data set gets a
+        directory holding one .npy file of dates and one .npy file for each column, and a manifest (a JSON file) indexes
+        them and lists their columns. Looking a data set up is a lookup in the manifest instead of trying to parse a CSV
+        file, and loading it memory-maps only the columns which are asked for instead of parsing every number and date.
+
+        The cache is aware of date ranges. A data set is stored once for each series (its id, transformation and
+        collapse) along with the range of dates it covers, and any range inside that is served by slicing the stored
+        series. When a wider range is asked for only the missing dates have to be fetched (see get_missing) and they
+        are merged into the stored series, so extending a series by a month downloads a month of data.
+        :param directory: the directory to store the data sets and the manifest in (it is created if it does not exist)
+        :return: a MarketCache object
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        # Data sets may be stored from more than one thread (see QuandlInterface.get_data_sets)
+        self.lock = threading.Lock()
+        try:
+            with open(self.manifest_path, "r") as manifest_file:
+                self.manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            self.manifest = {}
+
+    def get_key(self, argument):
+        """
+        This method names the entry of the series an argument asks for. The dates are not part of the name, every
+        range of the same series is stored in the same entry
+        :param argument: an Argument object
+        :return: the key of the series in the manifest
+        """
+        data_set_name = argument.id if argument.prefix is None else argument.prefix + argument.id
+        key = "id=" + data_set_name + " trans=" + str(argument.transformation) + " collapse=" + str(argument.collapse)
+        return key.replace("\\", "-").replace("/", "-")
+
+    def contains(self, argument):
+        """
+        This method checks whether the whole range of dates an argument asks for is in the cache
+        :param argument: an Argument object
+        :return: True if the data set can be loaded without fetching anything
+        """
+        return len(self.get_missing(argument)) == 0
+
+    def get_missing(self, argument):
+        """
+        This method works out which dates have to be fetched before the range an argument asks for can be served. The
+        stored range is kept in one piece, so a range which does not touch it also fetches the gap in between. Each
+        missing range overlaps the stored data by a day because transformations like rdiff can not be computed for
+        the first day that is fetched. A range after the stored data starts on its last stored day, and a range before
+        it ends on its first stored day so that the day before that (which the earlier fetch could not compute) is
+        fetched too. If the stored series
+        does not have every column the argument asks for (it was loaded from a CSV file whose columns had been dropped)
+        the whole of it has to be fetched again
+        :param argument: an Argument object
+        :return: a list of (start, end) pairs of dates (inclusive) as strings
+        """
+        entry = self.manifest.get(self.get_key(argument))
+        if entry is None:
+            return [(argument.start, argument.end)]
+        if not set(entry["dropped"]) <= set(argument.drop):
+            return [self.get_range(argument)]
+        start, end = numpy.datetime64(argument.start, "D"), numpy.datetime64(argument.end, "D")
+        stored_start, stored_end = numpy.datetime64(entry["start"], "D"), numpy.datetime64(entry["end"], "D")
+        missing = []
+        if start < stored_start:
+            # The stored range may start on a day without data, so the overlap is the first day which has data
+            missing.append((argument.start, entry.get("first", entry["start"])))
+        if end > stored_end:
+            # The stored range may end on a day without data, so the overlap is the last day which has data
+            missing.append((entry.get("last", entry["end"]), argument.end))
+        return missing
+
+    def get_range(self, argument):
+        """
+        This method works out the range of dates the series of an argument will cover once the argument is served
+        :param argument: an Argument object
+        :return: the (start, end) pair of dates (inclusive) covering both the stored range and the argument's range
+        """
+        entry = self.manifest.get(self.get_key(argument))
+        if entry is None:
+            return argument.start, argument.end
+        return min(argument.start, entry["start"]), max(argument.end, entry["end"])
+
+    def get(self, argument, columns=None):
+        """
+        This method loads the range of dates an argument asks for from the cache. The columns are memory-mapped and
+        sliced, so only the parts of them which are used are read from the disk
+        :param argument: an Argument object describing the data set
+        :param columns: the names of the columns to load, by default all of them except those the argument drops
+        :return: a pandas DataFrame indexed by date, or None if the range (or a column) is not in the cache
+        """
+        entry = self.manifest.get(self.get_key(argument))
+        if entry is None or not self.contains(argument):
+            return None
+        if columns is None:
+            columns = [column for column in entry["columns"] if column not in argument.drop]
+        path = os.path.join(self.directory, entry["directory"])
+        try:
+            dates = numpy.load(os.path.join(path, "dates.npy"), mmap_mode="r")
+            # The dates are sorted, so the range is found with a binary search
+            first = numpy.searchsorted(dates, numpy.datetime64(argument.start, "D"), side="left")
+            last = numpy.searchsorted(dates, numpy.datetime64(argument.end, "D"), side="right")
+            data = {column: numpy.load(os.path.join(path, str(entry["columns"].index(column)) + ".npy"),
+                                       mmap_mode="r")[first:last] for column in columns}
+        except (OSError, ValueError):
+            # The files of the entry are missing or damaged, so the data set has to be fetched again
+            return None
+        return pandas.DataFrame(data, index=pandas.DatetimeIndex(dates[first:last], name="Date"), columns=columns,
+                                copy=False)
+
+    def put(self, argument, data_frame, dropped=()):
+        """
+        This method merges a data set into the stored series, extending the range of dates the series covers to
+        include the range the argument asked for. Dates which were already stored keep their stored values. Only data
+        sets with the same columns are merged: a data set with different columns replaces the stored series if it
+        covers all of its dates, otherwise it is refused (rather than filling the columns either side lacks with NaN)
+        :param argument: an Argument object describing the data set (and the range of dates which was fetched)
+        :param data_frame: a pandas DataFrame indexed by date, with all of its columns (the argument's drop is applied
+        when it is loaded, see get)
+        :param dropped: the columns which were dropped from the data set before it was given to the cache (e.g. by the
+        CSV files of older versions), arguments which ask for any of them are not served from it
+        """
+        key = self.get_key(argument)
+        data_frame = data_frame.copy()
+        data_frame.index = pandas.to_datetime(data_frame.index).values.astype("datetime64[D]")
+        data_frame.columns = [str(c) for c in data_frame.columns]
+        dropped = sorted(dropped)
+        with self.lock:
+            entry = self.manifest.get(key)
+            start, end = argument.start, argument.end
+            stored = None if entry is None else self.get_stored(entry)
+            changed = stored is not None and set(stored.columns) != set(data_frame.columns)
+            if changed and len(stored) and len(data_frame):
+                if argument.start > entry["start"] or argument.end < entry["end"]:
+                    raise ValueError("The columns of the data set differ from the stored series", key,
+                                     list(stored.columns), list(data_frame.columns))
+                # The data set covers the whole of the stored series, so it replaces it
+                stored = None
+            if stored is not None:
+                if not len(data_frame):
+                    data_frame, dropped = stored, entry["dropped"]
+                elif len(stored):
+                    data_frame = pandas.concat([stored, data_frame[stored.columns]])
+                    dropped = sorted(set(dropped) & set(entry["dropped"]))
+                start = min(start, entry["start"])
+                end = max(end, entry["end"])
+            data_frame = data_frame[~data_frame.index.duplicated(keep="first")].sort_index()
+            # Every version of a series is written to a new directory so that data frames which are still mapped to
+            # the files of the old version are not changed under them
+            version = 1 if entry is None else entry["version"] + 1
+            directory = key + " v" + str(version)
+            path = os.path.join(self.directory, directory)
+            os.makedirs(path, exist_ok=True)
+            dates = data_frame.index.values.astype("datetime64[D]")
+            numpy.save(os.path.join(path, "dates.npy"), dates)
+            for i, column in enumerate(data_frame.columns):
+                numpy.save(os.path.join(path, str(i) + ".npy"), data_frame[column].to_numpy(dtype=float))
+            self.manifest[key] = {"id": argument.id, "prefix": argument.prefix,
+                                  "transformation": argument.transformation, "collapse": argument.collapse,
+                                  "start": start, "end": end, "columns": list(data_frame.columns),
+                                  "rows": len(data_frame), "dropped": dropped, "directory": directory,
+                                  "version": version}
+            if len(dates):
+                self.manifest[key]["first"], self.manifest[key]["last"] = str(dates[0]), str(dates[-1])
+            self.save_manifest()
+            if entry is not None:
+                shutil.rmtree(os.path.join(self.directory, entry["directory"]), ignore_errors=True)
+
+    def get_stored(self, entry):
+        """
+        This method loads the whole of a stored series into memory
+        :param entry: the entry of the series in the manifest
+        :return: a pandas DataFrame indexed by date, or None if its files are missing or damaged
+        """
+        path = os.path.join(self.directory, entry["directory"])
+        try:
+            dates = numpy.load(os.path.join(path, "dates.npy"))
+            data = {column: numpy.load(os.path.join(path, str(i) + ".npy"))
+                    for i, column in enumerate(entry["columns"])}
+        except (OSError, ValueError):
+            return None
+        return pandas.DataFrame(data, index=dates, columns=entry["columns"])
+
+    def save_manifest(self):
+        """
+        This method writes the manifest through a temporary file so that it is never left half written
+        """
+        temp_path = self.manifest_path + "." + str(os.getpid()) + ".tmp"
+        with open(temp_path, "w") as manifest_file:
+            json.dump(self.manifest, manifest_file, indent=1, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
@@ -1,10 +1,22 @@
 import scipy.special as spc
-import scipy.fftpack as sff
+import scipy.fft as sff
 import scipy.stats as sst
 import numpy
 import math
 import copy
 import os
+import sys
+import hashlib
+import inspect
+import collections
+import concurrent.futures
+
+from SourceCode.BitSequence import BitSequence
+from SourceCode.BinaryMatrices import BinaryMatrices
+from SourceCode.BerlekampMassey import BerlekampMassey
+from SourceCode.SamplePlan import SamplePlan
+from SourceCode.SuiteResults import SuiteResults
+from SourceCode.Instruments import Instruments
 
 
 class Colours:
@@ -15,7 +27,52 @@ class Colours:
 
 
 class RandomnessTester:
-    def __init__(self, bin, real_data=False, start_year=00, end_year=00):
+    # The name of each p-value returned by run_sample_tests, in order
+    test_names = ["01. Monobit Test",
+                  "02. Block Frequency Test",
+                  "03. Independent Runs Test",
+                  "04. Longest Runs Test",
+                  "05. Matrix Rank Test",
+                  "06. Spectral Test",
+                  "07. Non Overlapping Patterns Test",
+                  "08. Overlapping Patterns Test",
+                  "09. Universal Test",
+                  "10. Linear Complexity Test",
+                  "11. Serial Test (p01)",
+                  "11. Serial Test (p02)",
+                  "12. Approximate Entropy Test",
+                  "13. Cumulative Sums Test (Forward)",
+                  "13. Cumulative Sums Test (Backward)",
+                  "14. Random Excursions Test (p01)",
+                  "14. Random Excursions Test (p02)",
+                  "14. Random Excursions Test (p03)",
+                  "14. Random Excursions Test (p04)",
+                  "14. Random Excursions Test (p05)",
+                  "14. Random Excursions Test (906)",
+                  "14. Random Excursions Test (p07)",
+                  "14. Random Excursions Test (p08)",
+                  "15. Random Excursions Variant Test (p01)",
+                  "15. Random Excursions Variant Test (p02)",
+                  "15. Random Excursions Variant Test (p03)",
+                  "15. Random Excursions Variant Test (p04)",
+                  "15. Random Excursions Variant Test (p05)",
+                  "15. Random Excursions Variant Test (p06)",
+                  "15. Random Excursions Variant Test (p07)",
+                  "15. Random Excursions Variant Test (p08)",
+                  "15. Random Excursions Variant Test (p09)",
+                  "15. Random Excursions Variant Test (p10)",
+                  "15. Random Excursions Variant Test (p11)",
+                  "15. Random Excursions Variant Test (p12)",
+                  "15. Random Excursions Variant Test (p13)",
+                  "15. Random Excursions Variant Test (p14)",
+                  "15. Random Excursions Variant Test (p15)",
+                  "15. Random Excursions Variant Test (p16)",
+                  "15. Random Excursions Variant Test (p17)",
+                  "15. Random Excursions Variant Test (p18)"]
+    # The fingerprint of the code which computes the p-values (see get_implementation)
+    implementation = None
+
+    def __init__(self, bin, real_data=False, start_year=00, end_year=00, instruments=None, cache=None):
         """
         Initializes a RandomnessTester object. This object contains the NIST cryptographic tests for randomness [1].
         These tests only work on binary strings. The input data (bin) is a BinaryFrame object. A BinaryFrame object is
@@ -30,8 +87,13 @@ class RandomnessTester:
 
         [1] For more information see - http://csrc.nist.gov/publications/nistpubs/800-22-rev1a/SP800-22rev1a.pdf
         :param bin: this is a "BinaryFrame" object which is a conversion of a pandas DataFrame into a binary dictionary
+        :param instruments: an Instruments object which measures each test run by the suite (None to not measure)
+        :param cache: a ResultCache which stores the p-values of each sample so that samples which have already been
+        tested are not tested again (None to always run the tests)
         """
         self.bin = bin
+        self.instruments = instruments
+        self.cache = cache
         self.real_data = real_data
         self.start_year = start_year
         self.end_year = end_year
@@ -89,208 +151,246 @@ class RandomnessTester:
                 string_out += start_string + "\t"
             print(string_out)
 
-    def run_test_suite(self, block_size, matrix_size):
+    def run_test_suite(self, block_size, matrix_size, workers=1, verbose=True):
         """
-        This method runs all of the tests included in the NIST test suite for randomness
+        This method runs all of the tests included in the NIST test suite for randomness. If the tester has a cache only
+        the samples which are not in it are tested, and their p-values are added to it. The results of a sample are
+        keyed by its bits, the parameters, the names of the tests and a fingerprint of their code (see
+        get_implementation), so adding or changing a test never reuses results cached before the change
         :param block_size: the length of each block to look at for each bit string
         :param matrix_size: the size of the matrix to look at for each bit string
-        """
-        tests_passed = []
-        # For each data set in self.bin
+        :param workers: the number of processes to run the samples on, if more than one every (data set, sample) pair
+        is run on a process pool and the p-values are gathered back in order
+        :param verbose: whether to print the heading of each data set before its tests are run and its results after
+        they have run
+        :return: a SuiteResults object holding the p-values of every test on every sample of every data set
+        """
+        results = SuiteResults(self.bin.method, self.test_names, self.confidence_level)
+        executor = None
+        if workers is not None and workers > 1:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        try:
+            samples = self.get_samples(block_size, matrix_size, executor, 4 * workers if executor is not None else 0)
+            # For each data set in self.bin
+            for c in self.bin.columns:
+                if verbose:
+                    self.print_header(results.method, c)
+                # Run each one of the tests on the samples (or collect the results from the cache or the pool) and
+                # record the p_values
+                pvals = numpy.zeros((len(self.test_names), len(self.bin.bin_data[c])))
+                for i in range(pvals.shape[1]):
+                    bin_data, key, p_values = next(samples)
+                    cached = p_values is not None and not isinstance(p_values, concurrent.futures.Future)
+                    if p_values is None:
+                        p_values = self.run_sample_tests(bin_data, block_size, matrix_size)
+                    elif not cached and self.instruments is not None:
+                        # The workers measure the tests themselves and send the records back with the p-values
+                        p_values, records = p_values.result()
+                        for record in records:
+                            self.instruments.add_record(record)
+                    elif not cached:
+                        p_values = p_values.result()
+                    if key is not None and not cached:
+                        self.cache.put(key, p_values)
+                    pvals[:, i] = p_values
+
+                # For each test calculate the aggregate p_value and aggregate pass %
+                aggregate_pvals = [self.get_aggregate_pval(test_pvals) for test_pvals in pvals]
+                aggregate_pass = [self.get_aggregate_pass(test_pvals) for test_pvals in pvals]
+                results.add_data_set(c, pvals, aggregate_pvals, aggregate_pass)
+                if verbose:
+                    self.print_results(results, c, header=False)
+        finally:
+            # Shut the pool down however the suite stops (e.g. a test raising in a worker or a KeyboardInterrupt) so
+            # that its processes are not left behind
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        return results
+
+    def get_samples(self, block_size, matrix_size, executor=None, ahead=0):
+        """
+        This method goes through the samples of every data set in order, looking each one up in the cache (if the tester
+        has one) and submitting the samples which are not in it to the pool (if there is one). Up to ahead samples are
+        submitted before the first of them is handed back, which keeps the pool busy across data sets without holding
+        every sample (or its result) in memory at once
+        :param block_size: the length of each block to look at for each bit string
+        :param matrix_size: the size of the matrix to look at for each bit string
+        :param executor: a process pool to submit the samples to, or None to run them in this process
+        :param ahead: the number of samples to submit ahead of the one being collected
+        :return: a generator of (sample, key, p-values) tuples where the p-values are those found in the cache, a Future
+        for the p-values from the pool, or None if the sample still has to be tested (the key is None without a cache)
+        """
+        trace_memory = None if self.instruments is None else self.instruments.trace_memory
+        params = {"block_size": block_size, "matrix_size": matrix_size}
+        if self.cache is not None:
+            params.update(tests=tuple(self.test_names), implementation=self.get_implementation())
+        pending = collections.deque()
         for c in self.bin.columns:
-            print(Colours.Bold + "\n\tRunning " + self.bin.method + " based tests on", c + Colours.End, "\n")
-            test_names = ["\t01. Monobit Test",
-                          "\t02. Block Frequency Test",
-                          "\t03. Independent Runs Test",
-                          "\t04. Longest Runs Test",
-                          "\t05. Matrix Rank Test",
-                          "\t06. Spectral Test",
-                          "\t07. Non Overlapping Patterns Test",
-                          "\t08. Overlapping Patterns Test",
-                          "\t09. Universal Test",
-                          "\t10. Linear Complexity Test",
-                          "\t11. Serial Test (p01)",
-                          "\t11. Serial Test (p02)",
-                          "\t12. Approximate Entropy Test",
-                          "\t13. Cumulative Sums Test (Forward)",
-                          "\t13. Cumulative Sums Test (Backward)",
-                          "\t14. Random Excursions Test (p01)",
-                          "\t14. Random Excursions Test (p02)",
-                          "\t14. Random Excursions Test (p03)",
-                          "\t14. Random Excursions Test (p04)",
-                          "\t14. Random Excursions Test (p05)",
-                          "\t14. Random Excursions Test (906)",
-                          "\t14. Random Excursions Test (p07)",
-                          "\t14. Random Excursions Test (p08)",
-                          "\t15. Random Excursions Variant Test (p01)",
-                          "\t15. Random Excursions Variant Test (p02)",
-                          "\t15. Random Excursions Variant Test (p03)",
-                          "\t15. Random Excursions Variant Test (p04)",
-                          "\t15. Random Excursions Variant Test (p05)",
-                          "\t15. Random Excursions Variant Test (p06)",
-                          "\t15. Random Excursions Variant Test (p07)",
-                          "\t15. Random Excursions Variant Test (p08)",
-                          "\t15. Random Excursions Variant Test (p09)",
-                          "\t15. Random Excursions Variant Test (p10)",
-                          "\t15. Random Excursions Variant Test (p11)",
-                          "\t15. Random Excursions Variant Test (p12)",
-                          "\t15. Random Excursions Variant Test (p13)",
-                          "\t15. Random Excursions Variant Test (p14)",
-                          "\t15. Random Excursions Variant Test (p15)",
-                          "\t15. Random Excursions Variant Test (p16)",
-                          "\t15. Random Excursions Variant Test (p17)",
-                          "\t15. Random Excursions Variant Test (p18)"]
-
-            pvals = []
-            pval_strings = []
-            for i in range(len(test_names)):
-                length = len(test_names[i])
-                space = 45 - length
-                filler = "".zfill(space)
-                filler = filler.replace("0", " ")
-                test_names[i] += filler
-                pvals.append([])
-                pval_strings.append("")
-
-            # Get the samples for the data set
-            binary_strings = self.bin.bin_data[c]
-            # Run each one of the tests and record the p_values
-            for i in range(len(binary_strings)):
-                passed_values, p_values, str_data = [], [], binary_strings[i]
-
-                p_val = self.monobit(str_data)
-                pval_strings[0] += self.get_string(p_val)
-                pvals[0].append(p_val)
-
-                p_val = self.block_frequency(str_data, block_size=block_size)
-                pval_strings[1] += self.get_string(p_val)
-                pvals[1].append(p_val)
-
-                p_val = self.independent_runs(str_data)
-                pval_strings[2] += self.get_string(p_val)
-                pvals[2].append(p_val)
-
-                p_val = self.longest_runs(str_data)
-                pval_strings[3] += self.get_string(p_val)
-                pvals[3].append(p_val)
-
-                p_val = self.matrix_rank(str_data, matrix_size)
-                pval_strings[4] += self.get_string(p_val)
-                pvals[4].append(p_val)
-
-                p_val = self.spectral(str_data)
-                pval_strings[5] += self.get_string(p_val)
-                pvals[5].append(p_val)
-
-                p_val = self.non_overlapping_patterns(str_data, "11110000")
-                pval_strings[6] += self.get_string(p_val)
-                pvals[6].append(p_val)
-
-                p_val = self.overlapping_patterns(str_data, block_size=block_size)
-                pval_strings[7] += self.get_string(p_val)
-                pvals[7].append(p_val)
-
-                p_val = self.universal(str_data)
-                pval_strings[8] += self.get_string(p_val)
-                pvals[8].append(p_val)
-
-                p_val = self.linear_complexity(str_data, block_size=block_size)
-                pval_strings[9] += self.get_string(p_val)
-                pvals[9].append(p_val)
-
-                p_val_one, p_val_two = self.serial(str_data, method="both")
-                # The serial test can return two p-values add one
-                pval_strings[10] += self.get_string(p_val_one)
-                pvals[10].append(p_val_one)
-                # The serial test can return two p-values add two
-                pval_strings[11] += self.get_string(p_val_two)
-                pvals[11].append(p_val_two)
-
-                p_val = self.approximate_entropy(str_data)
-                pval_strings[12] += self.get_string(p_val)
-                pvals[12].append(p_val)
-
-                p_val = self.cumulative_sums(str_data, method="forward")
-                pval_strings[13] += self.get_string(p_val)
-                pvals[13].append(p_val)
-
-                p_val = self.cumulative_sums(str_data, method="backward")
-                pval_strings[14] += self.get_string(p_val)
-                pvals[14].append(p_val)
-
-                p_values = self.random_excursions(str_data)
-                for j in range(15, 15 + 8):
-                    pvals[j].append(p_values[j - 15])
-                    pval_strings[j] += self.get_string(p_values[j - 15])
-
-                p_values = self.random_excursions_variant(str_data)
-                for j in range(23, 23 + 18):
-                    pvals[j].append(p_values[j - 23])
-                    pval_strings[j] += self.get_string(p_values[j - 23])
-
-            # For each sample calculate the aggregate p_value and aggregate pass %
-            aggregate_pvals, aggregate_pass = [], []
-            for i in range(len(binary_strings)):
-                for j in range(len(pvals)):
-                    aggregate_pvals.append(self.get_aggregate_pval(pvals[j]))
-                    aggregate_pass.append(self.get_aggregate_pass(pvals[j]))
-
-            tests_passed_this = 0
-            # Print the results to the console
-            self.print_dates(len(binary_strings))
-            for i in range(len(test_names)):
-                pass_string = Colours.Bold + Colours.Fail + "FAIL!\t" + Colours.End
-                # NIST documentation recommends 0.96 ... but also more samples
-                if aggregate_pass[i] >= 0.90:
-                    pass_string = Colours.Bold + Colours.Pass + "PASS!\t" + Colours.End
-                    tests_passed_this += 1
-                if (numpy.array(pvals[i]) == -1.0).sum() > 0:
-                    pass_string = Colours.Bold + "SKIP!\t" + Colours.End
-
-                pval_string = Colours.Bold + Colours.Fail + "p=" + "{0:.5f}".format(
-                    aggregate_pvals[i]) + "\t" + Colours.End
-                if aggregate_pvals[i] > self.confidence_level:
-                    pval_string = Colours.Bold + Colours.Pass + "p=" + "{0:.5f}".format(
-                        aggregate_pvals[i]) + "\t" + Colours.End
-                if (numpy.array(pvals[i]) == -1.0).sum() > 0:
-                    pval_string = "p=SKIPPED\t"
-
-                print(test_names[i] + pass_string + pval_string + pval_strings[i])
-
-            tests_passed.append(tests_passed_this)
-        return tests_passed
+            for binary_string in self.bin.bin_data[c]:
+                bin_data, key, p_values = binary_string, None, None
+                if self.cache is not None or executor is not None:
+                    bin_data = BitSequence.convert(binary_string)
+                if self.cache is not None:
+                    key = self.cache.key(bin_data, "run_sample_tests", **params)
+                    p_values = self.cache.get(key)
+                if p_values is None and executor is not None:
+                    p_values = executor.submit(run_sample_tests, bin_data, block_size, matrix_size, trace_memory)
+                pending.append((bin_data, key, p_values))
+                if len(pending) > ahead:
+                    yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+
+    @classmethod
+    def get_implementation(cls):
+        """
+        This method fingerprints the code which computes the p-values, that is the source of this module and of the
+        modules the tests are built on. Any change to them changes the fingerprint, so results cached by a different
+        version of the tests are not found again
+        :return: a string of hexadecimal digits
+        """
+        if cls.implementation is None:
+            digest = hashlib.blake2b(digest_size=16)
+            for module_name in (cls.__module__, BitSequence.__module__, SamplePlan.__module__,
+                                BinaryMatrices.__module__, BerlekampMassey.__module__):
+                with open(inspect.getsourcefile(sys.modules[module_name]), "rb") as source_file:
+                    digest.update(source_file.read())
+            cls.implementation = digest.hexdigest()
+        return cls.implementation
+
+    def print_header(self, method, data_set):
+        """
+        This method prints the heading of the results of one data set to the console
+        :param method: the method used to convert the data set to binary
+        :param data_set: the name of the data set
+        """
+        print(Colours.Bold + "\n\tRunning " + method + " based tests on", data_set + Colours.End, "\n")
+
+    def print_results(self, results, data_set, header=True):
+        """
+        This method prints the results of all of the tests on one data set to the console
+        :param results: a SuiteResults object
+        :param data_set: the name of the data set to print
+        :param header: whether to print the heading first (run_test_suite prints it before the tests are run instead)
+        """
+        if header:
+            self.print_header(results.method, data_set)
+        pvals = results.p_values[data_set]
+        passed, skipped = results.passed(data_set), results.skipped(data_set)
+        # Print the results to the console
+        self.print_dates(pvals.shape[1])
+        for i in range(len(results.test_names)):
+            test_name = "\t" + results.test_names[i].ljust(44)
+            pass_string = Colours.Bold + Colours.Fail + "FAIL!\t" + Colours.End
+            # NIST documentation recommends 0.96 ... but also more samples
+            if passed[i]:
+                pass_string = Colours.Bold + Colours.Pass + "PASS!\t" + Colours.End
+            if skipped[i]:
+                pass_string = Colours.Bold + "SKIP!\t" + Colours.End
+
+            aggregate_pval = results.aggregate_p_values[data_set][i]
+            pval_string = Colours.Bold + Colours.Fail + "p=" + "{0:.5f}".format(aggregate_pval) + "\t" + Colours.End
+            if aggregate_pval > self.confidence_level:
+                pval_string = Colours.Bold + Colours.Pass + "p=" + "{0:.5f}".format(aggregate_pval) + "\t" + Colours.End
+            if skipped[i]:
+                pval_string = "p=SKIPPED\t"
+
+            print(test_name + pass_string + pval_string + "".join(self.get_string(p_val) for p_val in pvals[i]))
+
+    def run_sample_tests(self, bin_data, block_size, matrix_size):
+        """
+        This method runs all of the tests included in the NIST test suite on one sample
+        :param bin_data: a binary string or a BitSequence
+        :param block_size: the length of each block to look at for each bit string
+        :param matrix_size: the size of the matrix to look at for each bit string
+        :return: the list of p-values, in the order of test_names
+        """
+        # Pack the sample once and plan it so that every test works on the same BitSequence and shares the primitives
+        str_data = SamplePlan.convert(bin_data)
+        run = self.run_test
+        p_values = [run(self.monobit, str_data),
+                    run(self.block_frequency, str_data, block_size=block_size),
+                    run(self.independent_runs, str_data),
+                    run(self.longest_runs, str_data),
+                    run(self.matrix_rank, str_data, matrix_size),
+                    run(self.spectral, str_data),
+                    run(self.non_overlapping_patterns, str_data, "11110000"),
+                    run(self.overlapping_patterns, str_data, block_size=block_size),
+                    run(self.universal, str_data),
+                    run(self.linear_complexity, str_data, block_size=block_size)]
+        # The serial test can return two p-values
+        p_values += run(self.serial, str_data, method="both")
+        p_values.append(run(self.approximate_entropy, str_data))
+        p_values.append(run(self.cumulative_sums, str_data, method="forward"))
+        p_values.append(run(self.cumulative_sums, str_data, method="backward"))
+        p_values += run(self.random_excursions, str_data)
+        p_values += run(self.random_excursions_variant, str_data)
+        return p_values
+
+    def run_test(self, test, bin_data, *args, **kwargs):
+        """
+        This method runs one test on one sample, measuring it if the tester has instruments. Note that the tests share
+        the primitives of a SamplePlan, so the first test to ask for a primitive is the one which is charged for it
+        :param test: the test to run e.g. self.monobit
+        :param bin_data: a binary string or a BitSequence
+        :return: the p-value(s) returned by the test
+        """
+        if self.instruments is None:
+            return test(bin_data, *args, **kwargs)
+        with self.instruments.measure("test", test.__name__, (len(bin_data) + 7) // 8):
+            return test(bin_data, *args, **kwargs)
+
+    def run_stream_tests(self, bin_stream, block_size=128):
+        """
+        This method runs the tests which can be computed from the accumulators of a BitStream (i.e. without holding the
+        whole sequence in memory) once all of the chunks of the sequence have been fed into it
+        :param bin_stream: a BitStream (which must have counted blocks of block_size bits)
+        :param block_size: the length of each block to look at for the block frequency test
+        :return: the list of p-values, in the same order as test_names but without the Matrix Rank, Spectral, Non
+        Overlapping Patterns, Overlapping Patterns, Universal and Linear Complexity tests
+        """
+        p_values = [self.monobit(bin_stream),
+                    self.block_frequency(bin_stream, block_size=block_size),
+                    self.independent_runs(bin_stream),
+                    self.longest_runs(bin_stream)]
+        p_values += self.serial(bin_stream, method="both")
+        p_values.append(self.approximate_entropy(bin_stream))
+        p_values.append(self.cumulative_sums(bin_stream, method="forward"))
+        p_values.append(self.cumulative_sums(bin_stream, method="backward"))
+        p_values += self.random_excursions(bin_stream)
+        p_values += self.random_excursions_variant(bin_stream)
+        return p_values
 
     def load_test_data(self, data_set_name):
         """
-        This method is used to load in a test-data binary string. These data sets are included in the TestData directory
-        :param data_set_name: the name of the test data set to load e.g. e.csv, pi.csv, etc.
-        :return: a raw binary string of the data
+        This method is used to load in a test-data binary sequence. These data sets are included in the TestData
+        directory. Files of '0' and '1' characters are decoded once and cached in a packed sidecar file, files of raw
+        bytes (e.g. sha1) are memory-mapped
+        :param data_set_name: the name of the test data set to load e.g. e, pi, etc.
+        :return: a BitSequence of the data
         """
+        basepath = os.path.dirname(__file__)
+        path = os.path.abspath(os.path.join(basepath, os.pardir, "TestData", data_set_name))
         try:
-            raw_data = ""
-            path = os.path.join(os.getcwd(), os.pardir, "TestData", data_set_name)
-            with open(path, 'r+') as data_set_file:
-                for line in data_set_file:
-                    raw_data += line.replace("\n", "").replace("\t", "").replace(" ", "")
-            return raw_data
+            return BitSequence.load(path)
         except FileNotFoundError:
-            path = os.path.join(os.getcwd(), os.pardir, "TestData", data_set_name)
             print("File not found", path, "exiting")
             exit(0)
 
-    def generic_checker(self, test_name, expected, function, actual_out=None):
+    def generic_checker(self, test_name, expected, function, actual_out=None, data_sets=None):
         """
         This is a generic method for checking the outputs from one of the tests against known outputs to ensure that the
         test if acting as expected. Essentially it is a unit tester.
         :param test_name: the name of the test being checked
         :param expected: a list of expected p-values
         :param function: a reference to the function being checked
+        :param actual_out: the p-values already computed, by default they are computed from the test data sets
+        :param data_sets: the labels of the p-values in actual_out, by default the names of the test data sets
         """
         # Compute the output using the function
         print("\n\t", Colours.Bold + test_name + Colours.End)
-        if "Complexity" in test_name or "Matrix" in test_name:
-            print("\t", "This may take a while please be patient.")
-        data_sets = ["pi", "e", "sqrt2", "sqrt3"]
+        if data_sets is None:
+            data_sets = ["pi", "e", "sqrt2", "sqrt3"]
         if actual_out is None:
             for i in range(len(data_sets)):
                 p_val = function(self.load_test_data(data_sets[i])[:1000000])
@@ -324,6 +424,7 @@ class RandomnessTester:
         self.longest_runs_check()
         self.spectral_check()
         self.non_overlapping_patterns_check()
+        self.non_overlapping_patterns_battery_check()
         self.overlapping_patterns_check()
         self.universal_check()
         self.serial_check()
@@ -331,7 +432,6 @@ class RandomnessTester:
         self.cumulative_sums_check()
         self.random_excursions_check()
         self.random_excursions_variant_check()
-        # These checks are slow
         self.matrix_rank_check()
         self.linear_complexity_check()
 
@@ -341,13 +441,9 @@ class RandomnessTester:
         :param bin_data: the data from which to count zeros and ones
         :return: nothing.
         """
-        ones, zeros = 0, 0
-        # If the char is 0 minus 1, else add 1
-        for char in bin_data:
-            if char == '0':
-                zeros += 1
-            else:
-                ones += 1
+        bin_data = BitSequence.convert(bin_data)
+        ones = bin_data.count_ones()
+        zeros = len(bin_data) - ones
         print("\t", Colours.Italics + "Count 1 =", ones, "Count 0 =", zeros, Colours.End)
 
     def monobit(self, bin_data: str):
@@ -360,16 +456,12 @@ class RandomnessTester:
         for a truly random sequence. This test assesses the closeness of the fraction of ones to 1/2, that is the number
         of ones and zeros ina  sequence should be about the same. All subsequent tests depend on this test.
 
-        :param bin_data: a binary string
+        :param bin_data: a binary string or a BitSequence
         :return: the p-value from the test
         """
-        count = 0
-        # If the char is 0 minus 1, else add 1
-        for char in bin_data:
-            if char == '0':
-                count -= 1
-            else:
-                count += 1
+        bin_data = BitSequence.convert(bin_data)
+        # Each 1 adds 1 and each 0 subtracts 1 from the count
+        count = 2 * bin_data.count_ones() - len(bin_data)
         # Calculate the p value
         sobs = count / math.sqrt(len(bin_data))
         p_val = spc.erfc(math.fabs(sobs) / math.sqrt(2))
@@ -391,28 +483,16 @@ class RandomnessTester:
         whether the frequency of ones in an M-bit block is approximately M/2, as would be expected under an assumption
         of randomness. For block size M=1, this test degenerates to the monobit frequency test.
 
-        :param bin_data: a binary string
+        :param bin_data: a binary string or a BitSequence
         :return: the p-value from the test
         :param block_size: the size of the blocks that the binary sequence is partitioned into
         """
+        bin_data = BitSequence.convert(bin_data)
         # Work out the number of blocks, discard the remainder
         num_blocks = math.floor(len(bin_data) / block_size)
-        block_start, block_end = 0, block_size
-        # Keep track of the proportion of ones per block
-        proportion_sum = 0.0
-        for i in range(num_blocks):
-            # Slice the binary string into a block
-            block_data = bin_data[block_start:block_end]
-            # Keep track of the number of ones
-            ones_count = 0
-            for char in block_data:
-                if char == '1':
-                    ones_count += 1
-            pi = ones_count / block_size
-            proportion_sum += pow(pi - 0.5, 2.0)
-            # Update the slice locations
-            block_start += block_size
-            block_end += block_size
+        # Keep track of how many blocks have each possible proportion of ones
+        pi = numpy.arange(block_size + 1) / block_size
+        proportion_sum = float(numpy.sum(bin_data.block_count_histogram(block_size, num_blocks) * (pi - 0.5) ** 2.0))
         # Calculate the p-value
         chi_squared = 4.0 * block_size * proportion_sum
         p_val = spc.gammaincc(num_blocks / 2, chi_squared / 2)
@@ -436,21 +516,18 @@ class RandomnessTester:
         of various lengths is as expected for a random sequence. In particular, this tests determines whether the
         oscillation between zeros and ones is either too fast or too slow.
 
-        :param bin_data: a binary string
+        :param bin_data: a binary string or a BitSequence
         :return: the p-value from the test
         """
-        ones_count, n = 0, len(bin_data)
-        for char in bin_data:
-            if char == '1':
-                ones_count += 1
-        p, vobs = float(ones_count / n), 1
+        bin_data = BitSequence.convert(bin_data)
+        ones_count, n = bin_data.count_ones(), len(bin_data)
+        p = float(ones_count / n)
         tau = 2 / math.sqrt(len(bin_data))
         if abs(p - 0.5) > tau:
             return 0.0
         else:
-            for i in range(1, n):
-                if bin_data[i] != bin_data[i - 1]:
-                    vobs += 1
+            # Every change between a 0 and a 1 starts a new run
+            vobs = 1 + bin_data.transitions()
             # expected_runs = 1 + 2 * (n - 1) * 0.5 * 0.5
             # print("\t", Colours.Italics + "Observed runs =", vobs, "Expected runs", expected_runs, Colours.End)
             num = abs(vobs - 2.0 * n * p * (1.0 - p))
@@ -476,9 +553,10 @@ class RandomnessTester:
         length of the longest run of ones implies that there is also an irregularity ub tge expected length of the long
         est run of zeroes. Therefore, only one test is necessary for this statistical tests of randomness
 
-        :param bin_data: a binary string
+        :param bin_data: a binary string or a BitSequence
         :return: the p-value from the test
         """
+        bin_data = BitSequence.convert(bin_data)
         if len(bin_data) < 128:
             print("\t", "Not enough data to run test!")
             return -1.0
@@ -498,30 +576,10 @@ class RandomnessTester:
         # Work out the number of blocks, discard the remainder
         # pik = [0.2148, 0.3672, 0.2305, 0.1875]
         num_blocks = math.floor(len(bin_data) / m)
-        frequencies = numpy.zeros(k + 1)
-        block_start, block_end = 0, m
-        for i in range(num_blocks):
-            # Slice the binary string into a block
-            block_data = bin_data[block_start:block_end]
-            # Keep track of the number of ones
-            max_run_count, run_count = 0, 0
-            for j in range(0, m):
-                if block_data[j] == '1':
-                    run_count += 1
-                    max_run_count = max(max_run_count, run_count)
-                else:
-                    max_run_count = max(max_run_count, run_count)
-                    run_count = 0
-            max_run_count = max(max_run_count, run_count)
-            if max_run_count < v_values[0]:
-                frequencies[0] += 1
-            for j in range(k):
-                if max_run_count == v_values[j]:
-                    frequencies[j] += 1
-            if max_run_count > v_values[k - 1]:
-                frequencies[k] += 1
-            block_start += m
-            block_end += m
+        max_run_counts = bin_data.longest_run_histogram(m, num_blocks)
+        # Runs shorter than v_values[0] fall into the first class and longer than v_values[k - 1] into the last
+        classes = numpy.clip(numpy.arange(m + 1) - v_values[0], 0, k)
+        frequencies = numpy.bincount(classes, weights=max_run_counts, minlength=k + 1)
         # print(frequencies)
         chi_squared = 0
         for i in range(len(frequencies)):
@@ -545,37 +603,27 @@ class RandomnessTester:
         to check for linear dependence among fixed length sub strings of the original sequence. Note that this test
         also appears in the DIEHARD battery of tests.
 
-        :param bin_data: a binary string
+        :param bin_data: a binary string or a BitSequence
         :return: the p-value from the test
         """
-        shape = (matrix_size, matrix_size)
+        bin_data = BitSequence.convert(bin_data)
         n = len(bin_data)
         block_size = int(matrix_size * matrix_size)
         num_m = math.floor(n / (matrix_size * matrix_size))
-        block_start, block_end = 0, block_size
         # print(q, n, num_m, block_size)
 
         if num_m > 0:
             max_ranks = [0, 0, 0]
-            for im in range(num_m):
-                block_data = bin_data[block_start:block_end]
-                block = numpy.zeros(len(block_data))
-                for i in range(len(block_data)):
-                    if block_data[i] == '1':
-                        block[i] = 1.0
-                m = block.reshape(shape)
-                ranker = BinaryMatrix(m, matrix_size, matrix_size)
-                rank = ranker.compute_rank()
-                # print(rank)
-                if rank == matrix_size:
-                    max_ranks[0] += 1
-                elif rank == (matrix_size - 1):
-                    max_ranks[1] += 1
-                else:
-                    max_ranks[2] += 1
-                # Update index trackers
-                block_start += block_size
-                block_end += block_size
+            # Rank a batch of matrices at a time so that only a chunk of the sequence is ever unpacked
+            batch_size = max(1, BitSequence.chunk_size // block_size)
+            for first in range(0, num_m, batch_size):
+                batch = min(batch_size, num_m - first)
+                ranker = BinaryMatrices.from_sequence(bin_data[first * block_size:], matrix_size, matrix_size, batch)
+                ranks = ranker.compute_ranks()
+                # print(ranks)
+                max_ranks[0] += int((ranks == matrix_size).sum())
+                max_ranks[1] += int((ranks == matrix_size - 1).sum())
+                max_ranks[2] += int((ranks < matrix_size - 1).sum())
 
             piks = [1.0, 0.0, 0.0]
             for x in range(1, 50):
@@ -598,7 +646,7 @@ class RandomnessTester:
         expected = [0.083553, 0.306156, 0.823810, 0.314498]
         self.generic_checker("Testing Matrix Rank Test", expected, self.matrix_rank)
 
-    def spectral(self, bin_data: str):
+    def spectral(self, bin_data: str, workers=None, fast_length=False):
         """
         Note that this description is taken from the NIST documentation [1]
         [1] http://csrc.nist.gov/publications/nistpubs/800-22-rev1a/SP800-22rev1a.pdf
@@ -608,28 +656,59 @@ class RandomnessTester:
         sequence that would indicate a deviation from the assumption of randomness. The intention is to detect whether
         the number of peaks exceeding the 95 % threshold is significantly different than 5 %.
 
-        :param bin_data: a binary string
+        :param bin_data: a binary string or a BitSequence
+        :param workers: the number of threads the FFT may use, by default one
+        :param fast_length: if true only the longest prefix whose length is a fast FFT length is analysed
         :return: the p-value from the test
         """
+        n, p_val = self.spectral_statistics(bin_data, workers, fast_length)
+        return p_val
+
+    def spectral_statistics(self, bin_data: str, workers=None, fast_length=False, dtype=numpy.float32):
+        """
+        This method computes the spectral test and also returns the number of bits which were actually analysed. The
+        sequence is mapped to a -1 / +1 array of the given precision straight from the packed bits and transformed with
+        a real input FFT, which only computes the n / 2 + 1 non-redundant frequencies. The FFT is fastest when n only
+        has small prime factors, so with fast_length the sequence is truncated (never padded, which would change the
+        spectrum) to the longest prefix with such a length.
+        :param bin_data: a binary string or a BitSequence
+        :param workers: the number of threads the FFT may use, by default one
+        :param fast_length: if true only the longest prefix whose length is a fast FFT length is analysed
+        :param dtype: the floating point type of the transform, float32 (the default) or float64
+        :return: the number of bits analysed and the p-value from the test
+        """
+        bin_data = BitSequence.convert(bin_data)
         n = len(bin_data)
-        plus_minus_one = []
-        for char in bin_data:
-            if char == '0':
-                plus_minus_one.append(-1)
-            elif char == '1':
-                plus_minus_one.append(1)
+        if fast_length:
+            n = self.get_fast_length(n)
         # Product discrete fourier transform of plus minus one
-        s = sff.fft(plus_minus_one)
-        modulus = numpy.abs(s[0:n / 2])
+        s = sff.rfft(bin_data[:n].signs(dtype), workers=workers)
+        modulus = numpy.abs(s[0:n // 2])
         tau = numpy.sqrt(numpy.log(1 / 0.05) * n)
         # Theoretical number of peaks
         count_n0 = 0.95 * (n / 2)
         # Count the number of actual peaks m > T
-        count_n1 = len(numpy.where(modulus < tau)[0])
+        count_n1 = int(numpy.count_nonzero(modulus < tau))
         # Calculate d and return the p value statistic
         d = (count_n1 - count_n0) / numpy.sqrt(n * 0.95 * 0.05 / 4)
         p_val = spc.erfc(abs(d) / numpy.sqrt(2))
-        return p_val
+        return n, p_val
+
+    def get_fast_length(self, n):
+        """
+        This method is used by the spectral method to find the longest length at most n which is a product of 2's, 3's
+        and 5's (the lengths for which the FFT is fastest)
+        """
+        best = 1
+        power_five = 1
+        while power_five <= n:
+            power_three = power_five
+            while power_three <= n:
+                # The largest power of two which keeps the product at most n
+                best = max(best, power_three << ((n // power_three).bit_length() - 1))
+                power_three *= 3
+            power_five *= 5
+        return best
 
     def spectral_check(self):
         """
@@ -649,28 +728,32 @@ class RandomnessTester:
         search for a specific m-bit pattern. If the pattern is not found, the window slides one bit position. If the
         pattern is found, the window is reset to the bit after the found pattern, and the search resumes.
 
-        :param bin_data: a binary string
+        :param bin_data: a binary string or a BitSequence
         :param pattern: the pattern to match to
         :return: the p-value from the test
         """
+        bin_data = BitSequence.convert(bin_data)
         n = len(bin_data)
         pattern_size = len(pattern)
         block_size = math.floor(n / num_blocks)
-        pattern_counts = numpy.zeros(num_blocks)
-        # For each block in the data
-        for i in range(num_blocks):
-            block_start = i * block_size
-            block_end = block_start + block_size
-            block_data = bin_data[block_start:block_end]
-            # Count the number of pattern hits
-            j = 0
-            while j < block_size:
-                sub_block = block_data[j:j + pattern_size]
-                if sub_block == pattern:
-                    pattern_counts[i] += 1
-                    j += pattern_size
-                else:
-                    j += 1
+        # Find every window in every block which matches the pattern
+        codes = bin_data.block_window_codes(pattern_size, block_size, num_blocks)
+        hit_blocks, hit_starts = numpy.nonzero(codes == int(pattern, 2))
+        hit_starts = hit_starts.tolist()
+        # After a hit the window skips past the pattern, so a hit only counts if it starts after the last counted hit
+        # ended. Only hits which are closer than pattern_size to the hit before them need to be checked one by one
+        close = numpy.zeros(len(hit_starts), dtype=bool)
+        close[1:] = (numpy.diff(hit_blocks) == 0) & (numpy.diff(hit_starts) < pattern_size)
+        counted = ~close
+        last_end = 0
+        for k in numpy.flatnonzero(close).tolist():
+            # A hit which is not close to the one before it is always counted
+            if not close[k - 1]:
+                last_end = hit_starts[k - 1] + pattern_size
+            if hit_starts[k] >= last_end:
+                counted[k] = True
+                last_end = hit_starts[k] + pattern_size
+        pattern_counts = numpy.bincount(hit_blocks[counted], minlength=num_blocks).astype(float)
         # Calculate the theoretical mean and variance
         mean = (block_size - pattern_size + 1) / pow(2, pattern_size)
         var = block_size * ((1 / pow(2, pattern_size)) - (((2 * pattern_size) - 1) / (pow(2, pattern_size * 2))))
@@ -689,6 +772,64 @@ class RandomnessTester:
         expected = [0.165757, 0.078790, 0.569461, 0.532235]
         self.generic_checker("Check Non Overlapping Patterns Test", expected, self.non_overlapping_patterns)
 
+    def non_overlapping_patterns_battery(self, bin_data: str, pattern_size=9, num_blocks=8):
+        """
+        This method applies the non overlapping patterns test to every aperiodic template of length pattern_size (there
+        are 148 of them for the recommended length of 9) as done by the NIST test suite. The data is scanned once: the
+        number of times each possible pattern appears in each block is counted in one pass, and the counts for every
+        template are read from that table. Aperiodic templates can not overlap themselves, so the number of overlapping
+        hits in a block is the same as the number of non overlapping hits.
+
+        :param bin_data: a binary string or a BitSequence
+        :param pattern_size: the length of the templates
+        :param num_blocks: the number of blocks to split the data into
+        :return: a list of p-values, one for each template returned by get_aperiodic_templates
+        """
+        bin_data = BitSequence.convert(bin_data)
+        n = len(bin_data)
+        block_size = math.floor(n / num_blocks)
+        templates = numpy.array([int(template, 2) for template in self.get_aperiodic_templates(pattern_size)])
+        # Count every pattern in every block in one scan
+        codes = bin_data.block_window_codes(pattern_size, block_size, num_blocks)
+        rows = numpy.repeat(numpy.arange(num_blocks), codes.shape[1]) * pow(2, pattern_size)
+        block_counts = numpy.bincount(rows + codes.reshape(-1), minlength=num_blocks * pow(2, pattern_size))
+        pattern_counts = block_counts.reshape(num_blocks, pow(2, pattern_size))[:, templates]
+        # Calculate the theoretical mean and variance
+        mean = (block_size - pattern_size + 1) / pow(2, pattern_size)
+        var = block_size * ((1 / pow(2, pattern_size)) - (((2 * pattern_size) - 1) / (pow(2, pattern_size * 2))))
+        # Calculate the Chi Squared statistic and p value for each template
+        chi_squared = numpy.sum(pow(pattern_counts - mean, 2.0) / var, axis=0)
+        p_vals = spc.gammaincc(num_blocks / 2, chi_squared / 2)
+        return list(p_vals)
+
+    def get_aperiodic_templates(self, pattern_size):
+        """
+        This method generates every aperiodic template of a given length in increasing order. A template is aperiodic if
+        it can not overlap itself i.e. no proper suffix of the template is also a prefix of the template.
+        :param pattern_size: the length of the templates
+        :return: a list of binary strings
+        """
+        templates = []
+        for code in range(pow(2, pattern_size)):
+            template = format(code, "0" + str(pattern_size) + "b")
+            if not any(template[k:] == template[:pattern_size - k] for k in range(1, pattern_size)):
+                templates.append(template)
+        return templates
+
+    def non_overlapping_patterns_battery_check(self):
+        """
+        This is a test method for the non overlapping patterns battery. The p-values for the first template (000000001)
+        must match the ones from the non overlapping patterns test based on the example in the NIST documentation
+        """
+        expected = [0.165757, 0.078790, 0.569461, 0.532235]
+        p_values = []
+        data_sets = ["pi", "e", "sqrt2", "sqrt3"]
+        for ds in data_sets:
+            data = self.load_test_data(ds)[:1000000]
+            p_values.append(self.non_overlapping_patterns_battery(data)[0])
+        self.generic_checker("Check Non Overlapping Patterns Battery", expected, self.non_overlapping_patterns_battery,
+                             p_values)
+
     def overlapping_patterns(self, bin_data: str, pattern_size=9, block_size=1032):
         """
         Note that this description is taken from the NIST documentation [1]
@@ -700,14 +841,14 @@ class RandomnessTester:
         the window slides one bit position. The difference between this test and the test in Section 2.7 is that
         when the pattern is found, the window slides only one bit before resuming the search.
 
-        :param bin_data: a binary string
+        :param bin_data: a binary string or a BitSequence
         :param pattern_size: the length of the pattern
         :return: the p-value from the test
         """
+        bin_data = BitSequence.convert(bin_data)
         n = len(bin_data)
-        pattern = ""
-        for i in range(pattern_size):
-            pattern += "1"
+        # The pattern is pattern_size ones
+        pattern = pow(2, pattern_size) - 1
         num_blocks = math.floor(n / block_size)
         lambda_val = float(block_size - pattern_size + 1) / pow(2, pattern_size)
         eta = lambda_val / 2.0
@@ -716,23 +857,10 @@ class RandomnessTester:
         diff = float(numpy.array(piks).sum())
         piks.append(1.0 - diff)
 
-        pattern_counts = numpy.zeros(6)
-        for i in range(num_blocks):
-            block_start = i * block_size
-            block_end = block_start + block_size
-            block_data = bin_data[block_start:block_end]
-            # Count the number of pattern hits
-            pattern_count = 0
-            j = 0
-            while j < block_size:
-                sub_block = block_data[j:j + pattern_size]
-                if sub_block == pattern:
-                    pattern_count += 1
-                j += 1
-            if pattern_count <= 4:
-                pattern_counts[pattern_count] += 1
-            else:
-                pattern_counts[5] += 1
+        # Count the number of pattern hits in each block, every window is checked so hits may overlap
+        codes = bin_data.block_window_codes(pattern_size, block_size, num_blocks)
+        block_counts = (codes == pattern).sum(axis=1)
+        pattern_counts = numpy.bincount(numpy.minimum(block_counts, 5), minlength=6).astype(float)
 
         chi_squared = 0.0
         for i in range(len(pattern_counts)):
@@ -760,12 +888,13 @@ class RandomnessTester:
         The focus of this test is the number of bits between matching patterns (a measure that is related to the
         length of a compressed sequence). The purpose of the test is to detect whether or not the sequence can be
         significantly compressed without loss of information. A significantly compressible sequence is considered
-        to be non-random. **This test is always skipped because the requirements on the lengths of the binary
-        strings are too high i.e. there have not been enough trading days to meet the requirements.
+        to be non-random. **This test is always skipped on market data because the requirements on the lengths of the
+        binary strings are too high i.e. there have not been enough trading days to meet the requirements.
 
-        :param bin_data: a binary string
+        :param bin_data: a binary string or a BitSequence
         :return: the p-value from the test
         """
+        bin_data = BitSequence.convert(bin_data)
         # The below table is less relevant for us traders and markets than it is for security people
         n = len(bin_data)
         pattern_size = 5
@@ -792,16 +921,7 @@ class RandomnessTester:
         if n >= 1059061760:
             pattern_size = 16
 
-        if 5 < pattern_size < 16:
-            # Create the biggest binary string of length pattern_size
-            ones = ""
-            for i in range(pattern_size):
-                ones += "1"
-
-            # How long the state list should be
-            num_ints = int(ones, 2)
-            vobs = numpy.zeros(num_ints + 1)
-
+        if 5 < pattern_size <= 16:
             # Keeps track of the blocks, and whether were are initializing or summing
             num_blocks = math.floor(n / pattern_size)
             init_bits = 10 * pow(2, pattern_size)
@@ -814,21 +934,29 @@ class RandomnessTester:
                         10.170032, 11.168765, 12.168070, 13.167693, 14.167488, 15.167379]
             sigma = c * math.sqrt(variance[pattern_size] / test_bits)
 
+            # The state list holds the (one based) index of the last block with each pattern, zero if it hasn't occurred
+            vobs = numpy.zeros(2 ** pattern_size, dtype=numpy.int64)
             cumsum = 0.0
-            for i in range(num_blocks):
-                block_start = i * pattern_size
-                block_end = block_start + pattern_size
-                block_data = bin_data[block_start: block_end]
-                # Work out what state we are in
-                int_rep = int(block_data, 2)
-
-                # Initialize the state list
-                if i < init_bits:
-                    vobs[int_rep] = i + 1
-                else:
-                    initial = vobs[int_rep]
-                    vobs[int_rep] = i + 1
-                    cumsum += math.log(i - initial + 1, 2)
+            batch_size = max(1, BitSequence.chunk_size // pattern_size)
+            for first in range(0, num_blocks, batch_size):
+                batch = min(batch_size, num_blocks - first)
+                codes = bin_data[first * pattern_size:].block_codes(pattern_size, batch)
+                index = numpy.arange(first + 1, first + batch + 1, dtype=numpy.int64)
+                # Sorting the batch by pattern (stable, so in order of index) puts each block straight after the
+                # previous block in the batch with the same pattern. The first block of each pattern in the batch looks
+                # up the previous occurrence in the state list instead
+                order = numpy.argsort(codes, kind="stable")
+                sorted_codes = codes[order]
+                new_pattern = numpy.ones(batch, dtype=bool)
+                new_pattern[1:] = sorted_codes[1:] != sorted_codes[:-1]
+                previous = numpy.empty(batch, dtype=numpy.int64)
+                previous[1:] = index[order[:-1]]
+                previous[new_pattern] = vobs[sorted_codes[new_pattern]]
+                # Only the blocks after the initialization segment contribute to the sum
+                testing = index[order] > init_bits
+                cumsum += float(numpy.log2(index[order][testing] - previous[testing]).sum())
+                last_pattern = numpy.roll(new_pattern, -1)
+                vobs[sorted_codes[last_pattern]] = index[order[last_pattern]]
 
             # Calculate the statistic
             phi = float(cumsum / test_bits)
@@ -854,10 +982,11 @@ class RandomnessTester:
         determine whether or not the sequence is complex enough to be considered random. Random sequences are
         characterized by longer LFSRs. An LFSR that is too short implies non-randomness.
 
-        :param bin_data: a binary string
+        :param bin_data: a binary string or a BitSequence
         :param block_size: the size of the blocks to divide bin_data into. Recommended block_size >= 500
         :return:
         """
+        bin_data = BitSequence.convert(bin_data)
         dof = 6
         piks = [0.01047, 0.03125, 0.125, 0.5, 0.25, 0.0625, 0.020833]
 
@@ -866,19 +995,16 @@ class RandomnessTester:
 
         num_blocks = int(len(bin_data) / block_size)
         if num_blocks > 1:
-            block_end = block_size
-            block_start = 0
-            blocks = []
-            for i in range(num_blocks):
-                blocks.append(bin_data[block_start:block_end])
-                block_start += block_size
-                block_end += block_size
-
+            # Run the Berlekamp Massey algorithm on a batch of blocks at a time
             complexities = []
-            for block in blocks:
-                complexities.append(self.berlekamp_massey_algorithm(block))
-
-            t = ([-1.0 * (((-1) ** block_size) * (chunk - mean) + 2.0 / 9) for chunk in complexities])
+            batch_size = max(1, BitSequence.chunk_size // block_size)
+            for first in range(0, num_blocks, batch_size):
+                batch = min(batch_size, num_blocks - first)
+                lfsr = BerlekampMassey.from_sequence(bin_data[first * block_size:], block_size, batch)
+                complexities.append(lfsr.compute_complexities())
+            complexities = numpy.concatenate(complexities)
+
+            t = -1.0 * (((-1) ** block_size) * (complexities - mean) + 2.0 / 9)
             vg = numpy.histogram(t, bins=[-9999999999, -2.5, -1.5, -0.5, 0.5, 1.5, 2.5, 9999999999])[0][::-1]
             im = ([((vg[ii] - num_blocks * piks[ii]) ** 2) / (num_blocks * piks[ii]) for ii in range(7)])
 
@@ -946,35 +1072,23 @@ class RandomnessTester:
         sequences have uniformity; that is, every m-bit pattern has the same chance of appearing as every other
         m-bit pattern. Note that for m = 1, the Serial test is equivalent to the Frequency test of Section 2.1.
 
-        :param bin_data: a binary string
+        :param bin_data: a binary string or a BitSequence
         :param pattern_length: the length of the pattern (m)
         :return: the P value
         """
+        bin_data = BitSequence.convert(bin_data)
         n = len(bin_data)
-        # Add first m-1 bits to the end
-        bin_data += bin_data[:pattern_length - 1:]
-
-        # Get max length one patterns for m, m-1, m-2
-        max_pattern = ''
-        for i in range(pattern_length + 1):
-            max_pattern += '1'
-
-        # Keep track of each pattern's frequency (how often it appears)
-        vobs_one = numpy.zeros(int(max_pattern[0:pattern_length:], 2) + 1)
-        vobs_two = numpy.zeros(int(max_pattern[0:pattern_length - 1:], 2) + 1)
-        vobs_thr = numpy.zeros(int(max_pattern[0:pattern_length - 2:], 2) + 1)
 
-        for i in range(n):
-            # Work out what pattern is observed
-            vobs_one[int(bin_data[i:i + pattern_length:], 2)] += 1
-            vobs_two[int(bin_data[i:i + pattern_length - 1:], 2)] += 1
-            vobs_thr[int(bin_data[i:i + pattern_length - 2:], 2)] += 1
+        # Keep track of each pattern's frequency (how often it appears) for m, m-1, m-2. The windows wrap around the
+        # end of the sequence, so the m-1 and m-2 frequencies are folded from the m frequencies instead of recounted
+        vobs_one = bin_data.pattern_counts(pattern_length)
+        vobs_two = BitSequence.fold_pattern_counts(vobs_one, pattern_length - 1)
+        vobs_thr = BitSequence.fold_pattern_counts(vobs_two, pattern_length - 2)
 
         vobs = [vobs_one, vobs_two, vobs_thr]
         sums = numpy.zeros(3)
         for i in range(3):
-            for j in range(len(vobs[i])):
-                sums[i] += pow(vobs[i][j], 2)
+            sums[i] = float(numpy.sum(vobs[i] ** 2))
             sums[i] = (sums[i] * pow(2, pattern_length - i) / n) - n
 
         # Calculate the test statistics and p values
@@ -999,6 +1113,9 @@ class RandomnessTester:
         """
         expected = [0.143005, 0.766182, 0.861925, 0.157500]
         self.generic_checker("Check Serial Test", expected, self.serial)
+        # A sequence shorter than the patterns wraps around more than once
+        self.generic_checker("Check Serial Test (Short Sequence)", [0.498961], self.serial,
+                             [self.serial("101100101")], ["101100101"])
 
     def approximate_entropy(self, bin_data: str, pattern_length=10):
         """
@@ -1009,36 +1126,25 @@ class RandomnessTester:
         m-bit patterns across the entire sequence. The purpose of the test is to compare the frequency of overlapping
         blocks of two consecutive/adjacent lengths (m and m+1) against the expected result for a random sequence.
 
-        :param bin_data: a binary string
+        :param bin_data: a binary string or a BitSequence
         :param pattern_length: the length of the pattern (m)
         :return: the P value
         """
+        bin_data = BitSequence.convert(bin_data)
         n = len(bin_data)
-        # Add first m+1 bits to the end
-        # NOTE: documentation says m-1 bits but that doesnt make sense, or work.
-        bin_data += bin_data[:pattern_length + 1:]
 
-        # Get max length one patterns for m, m-1, m-2
-        max_pattern = ''
-        for i in range(pattern_length + 2):
-            max_pattern += '1'
-
-        # Keep track of each pattern's frequency (how often it appears)
-        vobs_one = numpy.zeros(int(max_pattern[0:pattern_length:], 2) + 1)
-        vobs_two = numpy.zeros(int(max_pattern[0:pattern_length + 1:], 2) + 1)
-
-        for i in range(n):
-            # Work out what pattern is observed
-            vobs_one[int(bin_data[i:i + pattern_length:], 2)] += 1
-            vobs_two[int(bin_data[i:i + pattern_length + 1:], 2)] += 1
+        # Keep track of each pattern's frequency (how often it appears) for m+1 and m. The windows wrap around the end
+        # of the sequence (the documentation says m-1 bits but that doesnt make sense, or work.) so the m frequencies
+        # are folded from the m+1 frequencies instead of recounted
+        vobs_two = bin_data.pattern_counts(pattern_length + 1)
+        vobs_one = BitSequence.fold_pattern_counts(vobs_two, pattern_length)
 
         # Calculate the test statistics and p values
         vobs = [vobs_one, vobs_two]
         sums = numpy.zeros(2)
         for i in range(2):
-            for j in range(len(vobs[i])):
-                if vobs[i][j] > 0:
-                    sums[i] += vobs[i][j] * math.log(vobs[i][j] / n)
+            for count in vobs[i][vobs[i] > 0].tolist():
+                sums[i] += count * math.log(count / n)
         sums /= n
         ape = sums[0] - sums[1]
         chi_squared = 2.0 * n * (math.log(2) - ape)
@@ -1052,6 +1158,9 @@ class RandomnessTester:
         """
         expected = [0.361595, 0.700073, 0.884740, 0.180481]
         self.generic_checker("Check Approximate Entropy Test", expected, self.approximate_entropy)
+        # A sequence shorter than the patterns wraps around more than once
+        self.generic_checker("Check Approximate Entropy Test (Short Sequence)", [1.0], self.approximate_entropy,
+                             [self.approximate_entropy("101100101")], ["101100101"])
 
     def cumulative_sums(self, bin_data: str, method="forward"):
         """
@@ -1065,46 +1174,34 @@ class RandomnessTester:
         For a random sequence, the excursions of the random walk should be near zero. For certain types of non-random
         sequences, the excursions of this random walk from zero will be large.
 
-        :param bin_data: a binary string
+        :param bin_data: a binary string or a BitSequence
         :param method: the method used to calculate the statistic
         :return: the P-value
         """
+        bin_data = BitSequence.convert(bin_data)
         n = len(bin_data)
-        counts = numpy.zeros(n)
-        # Calculate the statistic using a walk forward
-        if method != "forward":
-            bin_data = bin_data[::-1]
-
-        ix = 0
-        for char in bin_data:
-            sub = 1
-            if char == '0':
-                sub = -1
-            if ix > 0:
-                counts[ix] = counts[ix - 1] + sub
-            else:
-                counts[ix] = sub
-            ix += 1
+        total, minimum, maximum = bin_data.walk_extrema()
 
         # This is the maximum absolute level obtained by the sequence
-        abs_max = numpy.max(numpy.abs(counts))
+        abs_max = max(abs(minimum), abs(maximum))
+        if method != "forward":
+            # Walking backward every partial sum is the total minus a partial sum of the forward walk
+            abs_max = max(abs(total - minimum), abs(total - maximum))
 
         start = int(numpy.floor(0.25 * numpy.floor(-n / abs_max) + 1))
         end = int(numpy.floor(0.25 * numpy.floor(n / abs_max) - 1))
-        terms_one = []
-        for k in range(start, end + 1):
-            sub = sst.norm.cdf((4 * k - 1) * abs_max / numpy.sqrt(n))
-            terms_one.append(sst.norm.cdf((4 * k + 1) * abs_max / numpy.sqrt(n)) - sub)
+        k = numpy.arange(start, end + 1)
+        sub = sst.norm.cdf((4 * k - 1) * abs_max / numpy.sqrt(n))
+        terms_one = sst.norm.cdf((4 * k + 1) * abs_max / numpy.sqrt(n)) - sub
 
         start = int(numpy.floor(0.25 * numpy.floor(-n / abs_max - 3)))
         end = int(numpy.floor(0.25 * numpy.floor(n / abs_max) - 1))
-        terms_two = []
-        for k in range(start, end + 1):
-            sub = sst.norm.cdf((4 * k + 1) * abs_max / numpy.sqrt(n))
-            terms_two.append(sst.norm.cdf((4 * k + 3) * abs_max / numpy.sqrt(n)) - sub)
+        k = numpy.arange(start, end + 1)
+        sub = sst.norm.cdf((4 * k + 1) * abs_max / numpy.sqrt(n))
+        terms_two = sst.norm.cdf((4 * k + 3) * abs_max / numpy.sqrt(n)) - sub
 
-        p_val = 1.0 - numpy.sum(numpy.array(terms_one))
-        p_val += numpy.sum(numpy.array(terms_two))
+        p_val = 1.0 - numpy.sum(terms_one)
+        p_val += numpy.sum(terms_two)
         return p_val
 
     def cumulative_sums_check(self):
@@ -1133,45 +1230,16 @@ class RandomnessTester:
 
         States -> -4, -3, -2, -1 and +1, +2, +3, +4.
 
-        :param bin_data: a binary string
+        :param bin_data: a binary string or a BitSequence
         :return: the P-value
         """
-        # Turn all the binary digits into +1 or -1
-        int_data = numpy.zeros(len(bin_data))
-        for i in range(len(bin_data)):
-            if bin_data[i] == '0':
-                int_data[i] = -1.0
-            else:
-                int_data[i] = 1.0
-
-        # Calculate the cumulative sum
-        cumulative_sum = numpy.cumsum(int_data)
-        # Append a 0 to the end and beginning of the sum
-        cumulative_sum = numpy.append(cumulative_sum, [0])
-        cumulative_sum = numpy.append([0], cumulative_sum)
-
+        bin_data = BitSequence.convert(bin_data)
         # These are the states we are going to look at
         x_values = numpy.array([-4, -3, -2, -1, 1, 2, 3, 4])
 
-        # Identify all the locations where the cumulative sum revisits 0
-        position = numpy.where(cumulative_sum == 0)[0]
-        # For this identify all the cycles
-        cycles = []
-        for pos in range(len(position) - 1):
-            # Add this cycle to the list of cycles
-            cycles.append(cumulative_sum[position[pos]:position[pos + 1] + 1])
-        num_cycles = len(cycles)
-
-        state_count = []
-        for cycle in cycles:
-            # Determine the number of times each cycle visits each state
-            state_count.append(([len(numpy.where(cycle == state)[0]) for state in x_values]))
-        state_count = numpy.transpose(numpy.clip(state_count, 0, 5))
-
-        su = []
-        for cycle in range(6):
-            su.append([(sct == cycle).sum() for sct in state_count])
-        su = numpy.transpose(su)
+        # Number of cycles with 0, 1, 2, 3, 4 and 5 or more visits to each state
+        walk = bin_data.walk_statistics()
+        num_cycles, su = walk["cycles"], walk["excursions"]
 
         piks = ([([self.get_pik_value(uu, state) for uu in range(6)]) for state in x_values])
         inner_term = num_cycles * numpy.array(piks)
@@ -1214,19 +1282,13 @@ class RandomnessTester:
         to various states in the random walk. This test is actually a series of eighteen tests (and conclusions), one
         test and conclusion for each of the states: -9, -8, …, -1 and +1, +2, …, +9.
 
-        :param bin_data: a binary string
+        :param bin_data: a binary string or a BitSequence
         :return: the P-value
         """
-        int_data = numpy.zeros(len(bin_data))
-        for i in range(len(bin_data)):
-            int_data[i] = int(bin_data[i])
-        sum_int = (2 * int_data) - numpy.ones(len(int_data))
-        cumulative_sum = numpy.cumsum(sum_int)
-
-        li_data = []
-        for xs in sorted(set(cumulative_sum)):
-            if numpy.abs(xs) <= 9:
-                li_data.append([xs, len(numpy.where(cumulative_sum == xs)[0])])
+        bin_data = BitSequence.convert(bin_data)
+        # Count the visits to each of the states -9 to +9 of the cumulative sum
+        visits = bin_data.walk_statistics()["visits"]
+        li_data = [[xs, int(visits[xs + 9])] for xs in range(-9, 9 + 1)]
 
         j = self.get_frequency(li_data, 0) + 1
         p_values = []
@@ -1401,10 +1463,30 @@ def test_binary_matrix():
     print(ranker.compute_rank(verbose=True))
 
 
+def run_sample_tests(bin_data, block_size, matrix_size, trace_memory=None):
+    """
+    This function runs all of the tests on one sample. It is the unit of work which run_test_suite sends to the
+    processes in its pool (a module level function can be pickled, whereas a RandomnessTester holding a BinaryFrame
+    would have to be copied to every process)
+    :param bin_data: a binary string or a BitSequence
+    :param block_size: the length of each block to look at for each bit string
+    :param matrix_size: the size of the matrix to look at for each bit string
+    :param trace_memory: None to not measure the tests, otherwise the tests are measured by a new Instruments object
+    (which traces memory if this is True) and its records are returned along with the p-values
+    :return: the list of p-values for the sample (and the list of records if the tests were measured)
+    """
+    if trace_memory is None:
+        return RandomnessTester(None).run_sample_tests(bin_data, block_size, matrix_size)
+    instruments = Instruments(trace_memory)
+    p_values = RandomnessTester(None, instruments=instruments).run_sample_tests(bin_data, block_size, matrix_size)
+    return p_values, instruments.records
+
+
 if __name__ == '__main__':
     """
     Run this method if you want to check that the code is running as expected and is producing the correct P-value for
     each test as per the NIST documentation. It checks each test on the first million bits of pi, e, sqrt 2, and sqrt 3
+    Run it from the root of the project with python -m SourceCode.RandomnessTests
     """
     rng_tester = RandomnessTester(None)
     rng_tester.test_randomness_tester()
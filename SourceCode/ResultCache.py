@@ -0,0 +1,137 @@
+import hashlib
+import numpy
+import os
+
+from SourceCode.BitSequence import BitSequence
+
+
+class ResultCache:
+    # Change this whenever the way results are keyed or stored changes, so that old results are not reused
+    version = 1
+
+    def __init__(self, directory, max_bytes=64 * 2 ** 20):
+        """
+        A ResultCache stores the p-values of the tests on disk so that a sample which has already been tested is not
+        tested again. The p-values are addressed by their content: the key is a hash of the bits of the sample together
+        with the name of the test and its parameters, so a sample which has not changed (e.g. an old time period of a
+        MarketData series) is found again however it was loaded, and a sample which has changed gets a new key.
+
+        Each result is stored in its own .npy file in the directory. Reading a result touches its file so the modified
+        times of the files record when each was last used, and once the files take up more than max_bytes the least
+        recently used ones are removed.
+        :param directory: the directory to store the results in (it is created if it does not exist)
+        :param max_bytes: the most bytes the results may take up before the least recently used ones are removed
+        :return: a ResultCache object
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # The bytes taken up by the results, counted the first time a result is stored
+        self.size = None
+
+    def key(self, bin_data, test_name, **params):
+        """
+        This method computes the key of a test with the given parameters on the given sample
+        :param bin_data: a binary string or a BitSequence
+        :param test_name: the name of the test
+        :param params: the parameters of the test e.g. block_size=128
+        :return: the key, a string of hexadecimal digits
+        """
+        digest = hashlib.blake2b(BitSequence.convert(bin_data).digest(), digest_size=20)
+        digest.update(repr((self.version, test_name, sorted(params.items()))).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.directory, key + ".npy")
+
+    def get(self, key):
+        """
+        This method looks up the result with the given key, marking it as the most recently used
+        :param key: a key returned by the key method
+        :return: the numpy array of p-values, or None if the result is not in the cache
+        """
+        path = self.get_path(key)
+        try:
+            p_values = numpy.load(path)
+            os.utime(path)
+        except (OSError, ValueError):
+            # The result is missing (or was evicted while it was being read, or is corrupt)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return p_values
+
+    def put(self, key, p_values):
+        """
+        This method stores a result and then removes the least recently used results if the cache is too big
+        :param key: a key returned by the key method
+        :param p_values: the p-value(s) returned by the test
+        """
+        path = self.get_path(key)
+        # Write to a temporary file first so that other processes never read half a result
+        temp_path = path + "." + str(os.getpid()) + ".tmp"
+        try:
+            with open(temp_path, "wb") as result_file:
+                numpy.save(result_file, numpy.asarray(p_values, dtype=float))
+            # A result which is stored again replaces the old file, which no longer counts towards the size
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(temp_path, path)
+        except OSError:
+            # A cache which can not be written to is just a cache which never hits
+            return
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        if self.size is None:
+            self.size = sum(size for path, size, used in self.get_entries())
+        else:
+            self.size += os.path.getsize(path) - replaced
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def get_entries(self):
+        """
+        This method lists the results in the cache
+        :return: a list of (path, size in bytes, time last used) tuples
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npy"):
+                try:
+                    status = entry.stat()
+                except OSError:
+                    continue
+                entries.append((entry.path, status.st_size, status.st_mtime))
+        return entries
+
+    def evict(self):
+        """
+        This method removes the least recently used results until the cache takes up at most nine tenths of max_bytes
+        (so that it is not evicting again after every result which is stored)
+        """
+        entries = sorted(self.get_entries(), key=lambda entry: entry[2])
+        self.size = sum(size for path, size, used in entries)
+        for path, size, used in entries:
+            if self.size <= 0.9 * self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.size -= size
+
+    def clear(self):
+        """
+        This method removes every result from the cache
+        """
+        for path, size, used in self.get_entries():
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+        self.size = 0
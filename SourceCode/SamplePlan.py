@@ -0,0 +1,110 @@
+from SourceCode.BitSequence import BitSequence
+
+
+class SamplePlan(BitSequence):
+    def __init__(self, packed, length=None, offset=0):
+        """
+        A SamplePlan is a BitSequence which remembers the intermediate results (the primitives) that the tests derive
+        from it. Many of the tests in the suite are built on the same primitives: the Monobit, Cumulative Sums and both
+        Random Excursions tests all walk the cumulative sum of the sequence, and the Serial and Approximate Entropy tests
+        both count overlapping patterns. When a sample is wrapped in a SamplePlan before it is passed to the tests each
+        primitive is computed once, the first time a test asks for it, and every later test reuses it.
+
+        Primitives which can be derived from a bigger one are not computed at all: the walk statistics give the number
+        of ones, and the pattern counts for a width are folded out of the counts for any wider width already computed.
+        :param packed: a numpy uint8 array (or any buffer which can be viewed as one) containing the packed bits
+        :param length: the number of bits in the sequence, by default every bit in the buffer after the offset
+        :param offset: the position of the first bit of the sequence in the buffer
+        :return: a SamplePlan object
+        """
+        BitSequence.__init__(self, packed, length, offset)
+        self.intermediates = {}
+
+    @classmethod
+    def convert(cls, bin_data):
+        """
+        This method converts the input to one of the tests into a SamplePlan. A BitSequence is wrapped without copying
+        its buffer and a SamplePlan is returned as it is (along with everything it has already computed)
+        :param bin_data: a binary string, a BitSequence, or an array of zeros and ones
+        :return: a SamplePlan
+        """
+        if isinstance(bin_data, BitSequence) and not isinstance(bin_data, cls):
+            return cls(bin_data.packed, bin_data.length, bin_data.offset)
+        return super().convert(bin_data)
+
+    def __repr__(self):
+        return "SamplePlan(length=" + str(self.length) + ", intermediates=" + str(len(self.intermediates)) + ")"
+
+    def get_intermediate(self, key, compute):
+        """
+        This method returns a primitive from the plan, computing it first if this is the first time it was asked for
+        :param key: a hashable key which identifies the primitive (and its parameters)
+        :param compute: a function with no arguments which computes the primitive
+        :return: the primitive
+        """
+        if key not in self.intermediates:
+            self.intermediates[key] = compute()
+        return self.intermediates[key]
+
+    def count_ones(self):
+        """
+        This method counts the number of ones, using the walk statistics if they have already been computed
+        """
+        if "walk" in self.intermediates:
+            # Each one is a step up and each zero is a step down
+            return (self.intermediates["walk"]["total"] + self.length) // 2
+        return self.get_intermediate("ones", super().count_ones)
+
+    def transitions(self):
+        """
+        This method counts the number of positions where a bit differs from the next bit (computed once)
+        """
+        return self.get_intermediate("transitions", super().transitions)
+
+    def block_counts(self, block_size, num_blocks=None):
+        """
+        This method counts the number of ones in each block (computed once for each block size)
+        """
+        if num_blocks is None:
+            num_blocks = self.length // block_size
+        return self.get_intermediate(("block counts", block_size, num_blocks),
+                                     lambda: super(SamplePlan, self).block_counts(block_size, num_blocks))
+
+    def longest_runs(self, block_size, num_blocks=None):
+        """
+        This method finds the longest run of ones in each block (computed once for each block size)
+        """
+        if num_blocks is None:
+            num_blocks = self.length // block_size
+        return self.get_intermediate(("longest runs", block_size, num_blocks),
+                                     lambda: super(SamplePlan, self).longest_runs(block_size, num_blocks))
+
+    def walk_statistics(self):
+        """
+        This method computes the statistics of the cumulative sum of the sequence (computed once)
+        """
+        return self.get_intermediate("walk", super().walk_statistics)
+
+    def walk_extrema(self):
+        """
+        This method returns the final value and the extrema of the walk, taken from the walk statistics
+        """
+        walk = self.walk_statistics()
+        return walk["total"], walk["minimum"], walk["maximum"]
+
+    def pattern_counts(self, width):
+        """
+        This method counts the overlapping (circular) patterns of the given width. If the counts for a wider width have
+        already been computed the counts are folded out of them instead of counting the patterns again
+        :param width: the number of bits in each pattern
+        :return: a numpy array with the count of each of the 2^width patterns
+        """
+        key = ("patterns", width)
+        if key not in self.intermediates:
+            wider = [k[1] for k in self.intermediates if isinstance(k, tuple) and k[0] == "patterns" and k[1] > width]
+            if wider:
+                # Fold from the narrowest of the wider widths since it is the smallest table
+                self.intermediates[key] = self.fold_pattern_counts(self.intermediates[("patterns", min(wider))], width)
+            else:
+                self.intermediates[key] = super().pattern_counts(width)
+        return self.intermediates[key]
@@ -0,0 +1,50 @@
+import numpy
+
+from SourceCode.BitSequence import BitSequence
+
+
+class SampleWindows:
+    def __init__(self, sequence, starts, lengths):
+        """
+        A SampleWindows object is the list of samples of one column of a BinaryFrame. The bits of the whole column are
+        held once, in one BitSequence, and each sample is a window of it described only by the position of its first
+        bit and its length. Overlapping samples (e.g. ten year windows stepped forward one year at a time) share their
+        bits instead of each holding a copy of them, so a window costs two integers however long it is. Indexing the
+        object returns a BitSequence view of the window, which can be passed to any of the tests
+        :param sequence: the BitSequence holding the bits of every window
+        :param starts: the position of the first bit of each window in the sequence
+        :param lengths: the number of bits in each window
+        :return: a SampleWindows object
+        """
+        self.sequence = sequence
+        self.starts = numpy.asarray(starts, dtype=numpy.int64)
+        self.lengths = numpy.asarray(lengths, dtype=numpy.int64)
+        if len(self.starts) != len(self.lengths):
+            raise ValueError("Every window needs a start and a length", len(self.starts), len(self.lengths))
+        if len(self.starts) and ((self.starts < 0).any() or (self.starts + self.lengths > len(sequence)).any()):
+            raise ValueError("The windows must lie inside the sequence")
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __repr__(self):
+        return "SampleWindows(windows=" + str(len(self)) + ", bits=" + str(len(self.sequence)) + ")"
+
+    def __getitem__(self, item):
+        """
+        Indexing returns the window as a BitSequence view, slicing returns a SampleWindows object of those windows
+        :param item: an index or a slice
+        :return: a BitSequence or a SampleWindows object
+        """
+        if isinstance(item, slice):
+            return SampleWindows(self.sequence, self.starts[item], self.lengths[item])
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("SampleWindows index out of range")
+        start = int(self.starts[item])
+        return self.sequence[start:start + int(self.lengths[item])]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
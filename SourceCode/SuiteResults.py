@@ -0,0 +1,119 @@
+import json
+import numpy
+
+
+class SuiteResults:
+    def __init__(self, method, test_names, confidence_level=0.005, pass_level=0.90):
+        """
+        A SuiteResults object holds everything run_test_suite computes, separately from how it is displayed. For each
+        data set (column of the BinaryFrame) it stores a numpy array of p-values with one row per test and one column
+        per sample, along with the aggregate p-value and the proportion of samples which passed for every test.
+        Printing the results is left to RandomnessTester.print_results, and the results can be saved to JSON or to a
+        numpy NPZ file for other programs to read.
+        :param method: the method used to convert the data to binary
+        :param test_names: the name of each test (one per row of the p-value arrays)
+        :param confidence_level: samples with a p-value below this level failed the test
+        :param pass_level: a data set passes a test if at least this proportion of its samples passed
+        :return: a SuiteResults object
+        """
+        self.method = method
+        self.test_names = list(test_names)
+        self.confidence_level = confidence_level
+        self.pass_level = pass_level
+        self.data_sets = []
+        self.p_values = {}
+        self.aggregate_p_values = {}
+        self.pass_ratios = {}
+
+    def add_data_set(self, data_set, p_values, aggregate_p_values, pass_ratios):
+        """
+        This method adds the results for one data set
+        :param data_set: the name of the data set
+        :param p_values: an array of p-values with one row per test and one column per sample
+        :param aggregate_p_values: the aggregate p-value of each test
+        :param pass_ratios: the proportion of samples which passed each test
+        """
+        self.data_sets.append(data_set)
+        self.p_values[data_set] = numpy.asarray(p_values, dtype=float).reshape(len(self.test_names), -1)
+        self.aggregate_p_values[data_set] = numpy.asarray(aggregate_p_values, dtype=float)
+        self.pass_ratios[data_set] = numpy.asarray(pass_ratios, dtype=float)
+
+    def skipped(self, data_set):
+        """
+        This method flags the tests which were skipped for at least one sample (the tests return -1.0 when a sample is
+        too short for them)
+        :param data_set: the name of the data set
+        :return: a numpy boolean array with one flag per test
+        """
+        return (self.p_values[data_set] == -1.0).any(axis=1)
+
+    def passed(self, data_set):
+        """
+        This method flags the tests which the data set passed
+        :param data_set: the name of the data set
+        :return: a numpy boolean array with one flag per test
+        """
+        return self.pass_ratios[data_set] >= self.pass_level
+
+    def tests_passed(self):
+        """
+        This method counts the number of tests which each data set passed
+        :return: a list with the number of tests passed by each data set
+        """
+        return [int(self.passed(data_set).sum()) for data_set in self.data_sets]
+
+    def to_dict(self):
+        """
+        This method converts the results into plain python lists and dictionaries. Missing p-values (NaN) become None
+        :return: a dictionary of the results
+        """
+        def plain(values):
+            return numpy.where(numpy.isnan(values), None, values).tolist()
+
+        data_sets = {}
+        for data_set in self.data_sets:
+            data_sets[data_set] = {"p_values": plain(self.p_values[data_set]),
+                                   "aggregate_p_values": plain(self.aggregate_p_values[data_set]),
+                                   "pass_ratios": plain(self.pass_ratios[data_set]),
+                                   "passed": self.passed(data_set).tolist(),
+                                   "skipped": self.skipped(data_set).tolist()}
+        return {"method": self.method, "tests": self.test_names, "confidence_level": self.confidence_level,
+                "pass_level": self.pass_level, "data_sets": data_sets, "order": self.data_sets}
+
+    def to_json(self, path):
+        """
+        This method saves the results to a JSON file
+        :param path: the path of the file to write
+        """
+        with open(path, "w") as json_file:
+            json.dump(self.to_dict(), json_file, indent=1)
+
+    def to_npz(self, path):
+        """
+        This method saves the results to a numpy NPZ file. The arrays of data set i are stored as p_values_i,
+        aggregate_p_values_i and pass_ratios_i because data set names are not always valid array names
+        :param path: the path of the file to write
+        """
+        arrays = {"method": numpy.array(self.method), "tests": numpy.array(self.test_names),
+                  "data_sets": numpy.array(self.data_sets, dtype=str),
+                  "levels": numpy.array([self.confidence_level, self.pass_level])}
+        for i, data_set in enumerate(self.data_sets):
+            arrays["p_values_" + str(i)] = self.p_values[data_set]
+            arrays["aggregate_p_values_" + str(i)] = self.aggregate_p_values[data_set]
+            arrays["pass_ratios_" + str(i)] = self.pass_ratios[data_set]
+        numpy.savez_compressed(path, **arrays)
+
+    @classmethod
+    def from_npz(cls, path):
+        """
+        This method loads results which were saved with to_npz
+        :param path: the path of the file to read
+        :return: a SuiteResults object
+        """
+        with numpy.load(path) as arrays:
+            confidence_level, pass_level = arrays["levels"].tolist()
+            results = cls(str(arrays["method"]), arrays["tests"].tolist(), confidence_level, pass_level)
+            for i, data_set in enumerate(arrays["data_sets"].tolist()):
+                results.add_data_set(data_set, arrays["p_values_" + str(i)], arrays["aggregate_p_values_" + str(i)],
+                                     arrays["pass_ratios_" + str(i)])
+        return results
@@ -0,0 +1,136 @@
+import http.server
+import shutil
+import tempfile
+import threading
+import unittest
+import unittest.mock
+import urllib.parse
+import numpy
+import pandas
+import Quandl
+
+from SourceCode.DataDownloader import QuandlInterface, Argument
+from SourceCode.MarketCache import MarketCache
+
+
+class QuandlStub(http.server.BaseHTTPRequestHandler):
+    """
+    A stand-in for the Quandl API which serves every data set as the same series of prices (or their rdiff). The data
+    set THROTTLED answers 429 (too many requests) to its first two requests, ALWAYS_THROTTLED always answers 429, and
+    MISSING answers 404. Every request is recorded as a (data set, start, end) tuple
+    """
+    dates = pandas.bdate_range("1999-01-01", "2001-12-31")
+    prices = pandas.Series(numpy.exp(numpy.cumsum(numpy.random.default_rng(0).normal(0, 0.01, len(dates)))),
+                           index=dates)
+    requests = []
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        name = urllib.parse.unquote(url.path.split("/datasets/")[1][:-len(".csv")])
+        query = urllib.parse.parse_qs(url.query)
+        start, end = query["start_date"][0], query["end_date"][0]
+        with self.lock:
+            self.requests.append((name, start, end))
+            attempts = sum(1 for request in self.requests if request[0] == name)
+        if name.endswith("ALWAYS_THROTTLED") or (name.endswith("THROTTLED") and attempts <= 2):
+            self.send_response(429)
+            self.end_headers()
+            return
+        if name.endswith("MISSING"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        values = self.prices[start:end]
+        if query.get("transformation") == ["rdiff"]:
+            values = values.pct_change().iloc[1:]
+        body = "Date,Value\n" + "".join(str(date.date()) + "," + repr(float(value)) + "\n"
+                                        for date, value in values.items())
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.end_headers()
+        self.wfile.write(body.encode("utf-8"))
+
+
+class TestQuandlInterface(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), QuandlStub)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.api_url = "http://127.0.0.1:" + str(cls.server.server_address[1]) + "/api/v3"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        QuandlStub.requests.clear()
+        self.downloader = QuandlInterface("", cache=MarketCache(self.directory), workers=4, retries=3, backoff=0.5,
+                                          api_url=self.api_url)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def argument(self, id, start, end):
+        return Argument(id, start, end, "DB/", [], "rdiff")
+
+    def test_overlapping_arguments_are_fetched_once(self):
+        arguments = [self.argument("X", "2000-01-01", "2000-06-30"), self.argument("X", "2000-01-01", "2000-06-30"),
+                     self.argument("X", "2000-03-01", "2000-12-31")]
+        data_frames = self.downloader.fetch_series(arguments)
+        self.assertEqual(QuandlStub.requests, [("DB/X", "2000-01-01", "2000-12-31")])
+        self.assertEqual(len(data_frames), 2)
+        expected = QuandlStub.prices.pct_change()["2000-03-01":"2000-12-31"]
+        actual = data_frames[self.downloader.get_request_key(arguments[2])]
+        self.assertTrue(numpy.allclose(actual["Value"].values, expected.values))
+
+    def test_data_sets_are_fetched_once_each(self):
+        arguments = [self.argument("X", "2000-01-01", "2000-06-30"), self.argument("Y", "2000-01-01", "2000-06-30")]
+        data_frame = self.downloader.get_data_sets(arguments)
+        self.assertEqual(sorted(QuandlStub.requests),
+                         [("DB/X", "2000-01-01", "2000-06-30"), ("DB/Y", "2000-01-01", "2000-06-30")])
+        self.assertEqual(list(data_frame.columns), ["X_Value", "Y_Value"])
+        self.downloader.get_data_sets(arguments)
+        self.assertEqual(len(QuandlStub.requests), 2)
+
+    def test_only_missing_ranges_are_fetched(self):
+        self.downloader.get_data_set(self.argument("X", "2000-01-01", "2000-06-30"))
+        data_frame = self.downloader.get_data_set(self.argument("X", "1999-06-01", "2000-12-31"))
+        # The missing ranges overlap the stored data by its first (2000-01-04) and last (2000-06-30) days
+        self.assertEqual(QuandlStub.requests, [("DB/X", "2000-01-01", "2000-06-30"),
+                                               ("DB/X", "1999-06-01", "2000-01-04"),
+                                               ("DB/X", "2000-06-30", "2000-12-31")])
+        expected = QuandlStub.prices.pct_change()["1999-06-01":"2000-12-31"].iloc[1:]
+        self.assertTrue(numpy.allclose(data_frame["Value"].values, expected.values))
+
+    def test_call_limit_backoff(self):
+        with unittest.mock.patch("SourceCode.DataDownloader.time.sleep") as sleep:
+            data_frame = self.downloader.download_data_set(self.argument("THROTTLED", "2000-01-01", "2000-06-30"))
+        self.assertEqual(len(QuandlStub.requests), 3)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.5, 1.0])
+        self.assertGreater(len(data_frame), 0)
+
+    def test_call_limit_retries_run_out(self):
+        with unittest.mock.patch("SourceCode.DataDownloader.time.sleep") as sleep:
+            with self.assertRaises(Exception):
+                self.downloader.download_data_set(self.argument("ALWAYS_THROTTLED", "2000-01-01", "2000-06-30"))
+        self.assertEqual(len(QuandlStub.requests), 4)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.5, 1.0, 2.0])
+
+    def test_missing_data_set(self):
+        argument = self.argument("MISSING", "2000-01-01", "2000-06-30")
+        with self.assertRaises(Quandl.DatasetNotFound):
+            self.downloader.request_data_set("DB/MISSING", argument)
+        with self.assertRaises(Exception):
+            self.downloader.download_data_set(argument)
+        # A data set which is not found is not retried
+        self.assertEqual(len(QuandlStub.requests), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import shutil
+import tempfile
+import unittest
+import numpy
+import pandas
+
+from SourceCode.MarketCache import MarketCache
+from SourceCode.DataDownloader import Argument
+
+
+class TestMarketCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = MarketCache(self.directory)
+        dates = pandas.bdate_range("1998-01-01", "2001-12-31")
+        prices = numpy.exp(numpy.cumsum(numpy.random.default_rng(0).normal(0, 0.01, len(dates))))
+        self.prices = pandas.Series(prices, index=dates)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def fetch(self, argument):
+        """
+        This method returns what Quandl returns for an rdiff argument: the change of each day in the range, without
+        the first day of the range (which has no day before it in the range to compute the change from)
+        """
+        changes = self.prices[argument.start:argument.end].pct_change().iloc[1:]
+        return pandas.DataFrame({"Value": changes})
+
+    def serve(self, argument):
+        for start, end in self.cache.get_missing(argument):
+            part = Argument(argument.id, start, end, rdiff="rdiff")
+            self.cache.put(part, self.fetch(part))
+        return self.cache.get(argument)
+
+    def expected(self, argument):
+        return self.prices.pct_change()[argument.start:argument.end]
+
+    def test_extend_backward(self):
+        self.serve(Argument("X", "2000-01-01", "2000-12-31", rdiff="rdiff"))
+        argument = Argument("X", "1998-06-01", "2000-12-31", rdiff="rdiff")
+        data_frame = self.serve(argument)
+        # Only the first day of the first fetch (which has no change before it) may be missing
+        expected = self.expected(argument).iloc[1:]
+        self.assertTrue(numpy.allclose(data_frame["Value"].values, expected.values))
+        self.assertIn(numpy.datetime64("2000-01-03"), data_frame.index.values.astype("datetime64[D]"))
+        self.assertTrue(self.cache.contains(argument))
+
+    def test_extend_forward(self):
+        self.serve(Argument("X", "2000-01-01", "2000-12-31", rdiff="rdiff"))
+        argument = Argument("X", "2000-01-01", "2001-06-30", rdiff="rdiff")
+        data_frame = self.serve(argument)
+        expected = self.expected(argument).iloc[1:]
+        self.assertTrue(numpy.allclose(data_frame["Value"].values, expected.values))
+
+    def test_sub_range_needs_no_fetch(self):
+        self.serve(Argument("X", "2000-01-01", "2000-12-31", rdiff="rdiff"))
+        argument = Argument("X", "2000-03-01", "2000-06-30", rdiff="rdiff")
+        self.assertEqual(self.cache.get_missing(argument), [])
+        data_frame = self.cache.get(argument)
+        self.assertTrue(numpy.allclose(data_frame["Value"].values, self.expected(argument).values))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+import shutil
+import tempfile
+import unittest
+
+from SourceCode.ResultCache import ResultCache
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ResultCache(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_size_of_stored_again(self):
+        key = self.cache.key("0110" * 100, "monobit")
+        self.cache.put(key, [0.5])
+        self.cache.put(key, [0.25])
+        self.cache.put(key, [0.125])
+        self.assertEqual(self.cache.size, sum(size for path, size, used in self.cache.get_entries()))
+        self.assertEqual(list(self.cache.get(key)), [0.125])
+
+
+if __name__ == "__main__":
+    unittest.main()
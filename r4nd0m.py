@@ -31,7 +31,7 @@ def setup_environment():
     return token
 
 
-def construct_binary_frame(data_sets, method, token, start, end, years_per_block, isamples):
+def construct_binary_frame(data_sets, method, token, start, end, years_per_block, isamples, instruments=None):
     """
     This method is used to construct a BinaryFrame object from a meta-data file which specifies what data sets we want
     to download and what columns we are interested in from that data.
@@ -41,9 +41,10 @@ def construct_binary_frame(data_sets, method, token, start, end, years_per_block
     :param start: the start date
     :param end: the end date
     :param years_per_block: the time frame / dimension we want to look at
+    :param instruments: an Instruments object which measures the download and the conversion (None to not measure)
     :return: a BinaryFrame object which can work with the RandomnessTester class
     """
-    downloader = QuandlInterface(token)
+    downloader = QuandlInterface(token, instruments)
     data_file = pandas.read_csv(data_sets)
     data_sets = list(data_file["ID"])
     drop_columns = list(data_file["DROP"])
@@ -58,12 +59,13 @@ def construct_binary_frame(data_sets, method, token, start, end, years_per_block
             drop = []
         my_arguments.append(Argument(data_sets[i], start_date, end_date, data_prefix, drop, transform))
     data_frame_full = downloader.get_data_sets(my_arguments)
-    binary_frame = BinaryFrame(data_frame_full, start, end, years_per_block)
+    binary_frame = BinaryFrame(data_frame_full, start, end, years_per_block, instruments)
     binary_frame.convert(method, independent_samples=isamples)
     return binary_frame
 
 
-def run_experiments(data_sets, block_sizes, q_sizes, method, start, end, years_per_block, isamples=False):
+def run_experiments(data_sets, block_sizes, q_sizes, method, start, end, years_per_block, isamples=False,
+                    workers=1, instruments=None, cache=None):
     """
     This method just runs the experiments which were used to write the blog post
     :param data_sets: the file containing a list of data sets we want
@@ -73,6 +75,11 @@ def run_experiments(data_sets, block_sizes, q_sizes, method, start, end, years_p
     :param end: the end date
     :param methods: the methods of conversion to binary we want to test
     :param years_per_block: the time frame / dimension we want to look at
+    :param workers: the number of processes used to run the tests on the samples
+    :param instruments: an Instruments object which measures each stage of the experiments and prints a summary at the
+    end (None to not measure)
+    :param cache: a ResultCache for the p-values of the samples of the downloaded data sets, which only change when the
+    data does (None to always run the tests)
     :return: nothing just prints out stuff
     """
     print("\n")
@@ -89,7 +96,7 @@ def run_experiments(data_sets, block_sizes, q_sizes, method, start, end, years_p
     prng_binary_frame.convert(method, convert=False, independent_samples=isamples)
     # method, real_data, start_year, end_year, block_size
     rng_tester = RandomnessTester(prng_binary_frame, False, 00, 00)
-    passed = rng_tester.run_test_suite(block_sizes, q_sizes)
+    passed = rng_tester.run_test_suite(block_sizes, q_sizes, workers).tests_passed()
     for x in passed:
         all_passed.append(x)
 
@@ -102,17 +109,19 @@ def run_experiments(data_sets, block_sizes, q_sizes, method, start, end, years_p
     nrand_binary_frame = BinaryFrame(nrand_data, start, end, years_per_block)
     nrand_binary_frame.convert(method, convert=True, independent_samples=isamples)
     rng_tester = RandomnessTester(nrand_binary_frame, False, 00, 00)
-    passed = rng_tester.run_test_suite(block_sizes, q_sizes)
+    passed = rng_tester.run_test_suite(block_sizes, q_sizes, workers).tests_passed()
     for x in passed:
         all_passed.append(x)
 
     t = setup_environment()
-    my_binary_frame = construct_binary_frame(data_sets, method, t, start, end, years_per_block, isamples)
-    rng_tester = RandomnessTester(my_binary_frame, True, start, end)
-    passed = rng_tester.run_test_suite(block_sizes, q_sizes)
+    my_binary_frame = construct_binary_frame(data_sets, method, t, start, end, years_per_block, isamples, instruments)
+    rng_tester = RandomnessTester(my_binary_frame, True, start, end, instruments, cache)
+    passed = rng_tester.run_test_suite(block_sizes, q_sizes, workers).tests_passed()
     for x in passed:
         all_passed.append(x)
 
+    if instruments is not None:
+        instruments.print_summary()
     print("\n")
     return all_passed
 
@@ -140,7 +149,7 @@ if __name__ == '__main__':
     least_random_interval = 1
     for interval in range(5, 6):
         path = os.path.join("MetaData", file_name)
-        passed = run_experiments(path, 64, 4, m, start_year, end_year, interval)
+        passed = run_experiments(path, 64, 4, m, start_year, end_year, interval, workers=os.cpu_count())
         passed_avg = numpy.array(passed[2::]).mean()
         if passed_avg < least_random_fit:
             least_random_fit = passed_avg